@@ -0,0 +1,32 @@
+"""
+Command-line entry point: python -m mqttd
+
+Runs a plain MQTTApp broker with no handlers registered, e.g. for
+black-box testing or quick local experiments.
+"""
+
+import argparse
+import logging
+
+from .app import MQTTApp
+
+
+def main(argv=None):
+    """Parse arguments and run the broker (blocking)"""
+    parser = argparse.ArgumentParser(prog="python -m mqttd", description="Run an MQTTD broker")
+    parser.add_argument("--host", default="0.0.0.0", help="Host to bind to (default: 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=1883, help="TCP port to listen on (default: 1883)")
+    parser.add_argument("--max-connections", type=int, default=None, help="Maximum concurrent connections")
+    parser.add_argument("--no-uvloop", action="store_true", help="Use the default asyncio event loop even if uvloop is installed")
+    parser.add_argument("--log-level", default="WARNING", help="Logging level (default: WARNING)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.WARNING))
+
+    app = MQTTApp(host=args.host, port=args.port, max_connections=args.max_connections,
+                  enable_uvloop=not args.no_uvloop)
+    app.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ import asyncio
 import ssl
 import logging
 import struct
+import time
 from typing import Optional, Dict, List, Callable, Any, Tuple, Set
 from pathlib import Path
 import socket
@@ -19,7 +20,7 @@ from .properties import PropertyEncoder, PropertyType
 from .reason_codes import ReasonCode, MQTT3_TO_MQTT5_REASON_CODE
 from .types import MQTTMessage, MQTTClient, QoS
 from .decorators import subscribe, publish_handler, topic_matches
-from .session import SessionManager, SessionState
+from .session import SessionManager, SessionState, TOPIC_ALIAS_MAXIMUM
 from .thread_safe import ThreadSafeTopicTrie
 
 logger = logging.getLogger(__name__)
@@ -56,6 +57,11 @@ except ImportError:
     redis = None  # type: ignore[assignment]
     logger.warning("Redis not available. Install with: pip install redis>=5.0.0")
 
+try:
+    import uvloop  # type: ignore[import-not-found]
+except ImportError:
+    uvloop = None  # type: ignore[assignment]
+
 
 class MQTTApp:
     """
@@ -71,6 +77,9 @@ class MQTTApp:
         app.run(port=1883)
     """
     
+    # Minimum seconds between refreshes of non-scalar metrics (connections_per_ip)
+    METRICS_SNAPSHOT_INTERVAL = 1.0
+    
     def __init__(self, 
                  host: str = "0.0.0.0",
                  port: int = 1883,
@@ -90,7 +99,8 @@ class MQTTApp:
                  max_connections: Optional[int] = None,
                  max_connections_per_ip: Optional[int] = None,
                  max_messages_per_second: Optional[float] = None,
-                 max_subscriptions_per_minute: Optional[int] = None):
+                 max_subscriptions_per_minute: Optional[int] = None,
+                 enable_uvloop: bool = True):
         """
         Initialize MQTT application.
         
@@ -114,6 +124,7 @@ class MQTTApp:
             max_connections_per_ip: Maximum connections per IP address (None = unlimited)
             max_messages_per_second: Rate limit for messages per second per client (None = unlimited)
             max_subscriptions_per_minute: Rate limit for subscriptions per minute per client (None = unlimited)
+            enable_uvloop: Run the server on uvloop when it is installed (default: True)
         """
         self.host = host
         self.port = port
@@ -128,6 +139,9 @@ class MQTTApp:
         self.redis_password = redis_password
         self.redis_url = redis_url
         
+        # Event loop: uvloop is only used by run(), and only if installed
+        self.enable_uvloop = enable_uvloop and uvloop is not None
+        
         # Transport configuration
         self.enable_tcp = enable_tcp
         self.enable_quic = enable_quic
@@ -181,9 +195,12 @@ class MQTTApp:
             'current_connections': 0,
             'total_messages_published': 0,
             'total_messages_received': 0,
+            'total_messages_forwarded': 0,
             'total_subscriptions': 0,
             'total_unsubscriptions': 0,
         }
+        self._connections_per_ip_snapshot: Dict[str, int] = {}
+        self._metrics_snapshot_time = float('-inf')
         
         # Flow control: socket -> (in_flight_qos_messages, receive_maximum)
         self._flow_control: Dict[socket.socket, Tuple[int, Optional[int]]] = {}
@@ -222,6 +239,8 @@ class MQTTApp:
         # Server state
         self._server: Optional[asyncio.Server] = None
         self._running = False
+        # Set once the listeners are bound and accepting connections
+        self.ready = asyncio.Event()
         
         # Load configuration
         if config_file:
@@ -500,7 +519,8 @@ class MQTTApp:
                     wildcard_subscription_available=1,
                     subscription_identifier_available=1,
                     shared_subscription_available=0,  # Not implemented yet
-                    receive_maximum=server_receive_maximum  # Tell client our receive maximum
+                    receive_maximum=server_receive_maximum,  # Tell client our receive maximum
+                    topic_alias_maximum=TOPIC_ALIAS_MAXIMUM
                 )
             else:
                 # MQTT 3.1.1 CONNACK
@@ -685,6 +705,7 @@ class MQTTApp:
                 
                 writer.write(publish_msg)
                 await writer.drain()
+                self._metrics['total_messages_forwarded'] += 1
                 logger.debug(f"Forwarded message to client on topic: {topic}")
             except Exception as e:
                 logger.debug(f"Failed to send to client {client_sock}: {e}")
@@ -939,19 +960,28 @@ class MQTTApp:
                 topic_alias = publish_info.get('topic_alias')
                 
                 if topic_alias is not None:
+                    if not 0 < topic_alias <= TOPIC_ALIAS_MAXIMUM:
+                        # Alias 0 or above our advertised maximum is a protocol error
+                        logger.warning(f"Invalid topic alias {topic_alias} from client {client.client_id}")
+                        writer.write(MQTT5Protocol.build_disconnect_v5(
+                            reason_code=ReasonCode.TOPIC_ALIAS_INVALID
+                        ))
+                        await writer.drain()
+                        writer.close()
+                        return False
+                    
                     # Resolve topic from alias or store new alias
                     if client._session:
                         if topic is None or topic == '':
                             # Using alias - resolve from session
-                            topic = client._session.topic_aliases.get(topic_alias)
+                            topic = client._session.get_topic_alias(topic_alias)
                             if topic is None:
                                 logger.warning(f"Unknown topic alias {topic_alias} from client {client.client_id}")
                                 return False
                         else:
                             # Setting new alias - store in session
-                            if topic_alias > 0:
-                                client._session.topic_aliases[topic_alias] = topic
-                                logger.debug(f"Stored topic alias {topic_alias} -> {topic} for client {client.client_id}")
+                            client._session.set_topic_alias(topic_alias, topic)
+                            logger.debug(f"Stored topic alias {topic_alias} -> {topic} for client {client.client_id}")
                 
                 if topic is None:
                     logger.error("PUBLISH missing topic and no valid alias")
@@ -997,6 +1027,7 @@ class MQTTApp:
             logger.info(f"PUBLISH: topic={message.topic}, payload_len={len(message.payload)}")
             
             # Update metrics
+            self._metrics['total_messages_published'] += 1
             self._metrics['total_messages_received'] += 1
             
             # Handle retained messages
@@ -1128,50 +1159,13 @@ class MQTTApp:
                         logger.warning(f"Invalid message type: {hex(msg_type)}")
                         break
                     
-                    # Handle message based on type
-                    if msg_type == MQTTMessageType.SUBSCRIBE:
-                        await self._handle_subscribe(reader, writer, client, remaining_length)
-                        # Continue loop for persistent connection
-                    
-                    elif (msg_type & 0xF0) == MQTTMessageType.PUBLISH:
-                        await self._handle_publish(reader, writer, client, msg_type, remaining_length)
-                        # Continue loop for persistent connection
-                    
-                    elif msg_type == MQTTMessageType.PINGREQ:
-                        await self._handle_pingreq(writer)
-                        # Continue loop for persistent connection
-                    
-                    elif msg_type == MQTTMessageType.UNSUBSCRIBE:
-                        await self._handle_unsubscribe(reader, writer, client, remaining_length)
-                        # Continue loop for persistent connection
-                    
-                    elif msg_type == MQTTMessageType.DISCONNECT:
-                        logger.info("Received DISCONNECT")
-                        break
-                    
-                    elif msg_type == MQTTMessageType.PUBACK:
-                        # QoS 1 acknowledgment - just log for now
-                        logger.debug("Received PUBACK")
-                        # Continue loop
-                    
-                    elif msg_type == MQTTMessageType.PUBREC:
-                        # QoS 2 flow - handle PUBREC
-                        await self._handle_pubrec(reader, writer, client, remaining_length)
-                        # Continue loop
-                    
-                    elif msg_type == MQTTMessageType.PUBREL:
-                        # QoS 2 flow - handle PUBREL
-                        await self._handle_pubrel(reader, writer, client, remaining_length)
-                        # Continue loop
-                    
-                    elif msg_type == MQTTMessageType.PUBCOMP:
-                        # QoS 2 flow - just log for now
-                        logger.debug("Received PUBCOMP")
-                        # Continue loop
-                    
-                    else:
+                    # Handle message based on type (one table lookup on the header byte)
+                    handler = self._PACKET_DISPATCH[msg_type]
+                    if handler is None:
                         logger.warning(f"Unsupported message type: {hex(msg_type)}")
                         break
+                    if not await handler(self, reader, writer, client, msg_type, remaining_length):
+                        break
                         
                 except asyncio.TimeoutError:
                     logger.info("Client timeout")
@@ -1229,6 +1223,65 @@ class MQTTApp:
             await writer.wait_closed()
             logger.info("Client disconnected")
     
+    # Packet dispatch: each entry takes (self, reader, writer, client, msg_type,
+    # remaining_length) and returns False to end the connection
+    
+    async def _dispatch_subscribe(self, reader, writer, client, msg_type, remaining_length) -> bool:
+        await self._handle_subscribe(reader, writer, client, remaining_length)
+        return True
+    
+    async def _dispatch_publish(self, reader, writer, client, msg_type, remaining_length) -> bool:
+        await self._handle_publish(reader, writer, client, msg_type, remaining_length)
+        return True
+    
+    async def _dispatch_pingreq(self, reader, writer, client, msg_type, remaining_length) -> bool:
+        await self._handle_pingreq(writer)
+        return True
+    
+    async def _dispatch_unsubscribe(self, reader, writer, client, msg_type, remaining_length) -> bool:
+        await self._handle_unsubscribe(reader, writer, client, remaining_length)
+        return True
+    
+    async def _dispatch_disconnect(self, reader, writer, client, msg_type, remaining_length) -> bool:
+        logger.info("Received DISCONNECT")
+        return False
+    
+    async def _dispatch_puback(self, reader, writer, client, msg_type, remaining_length) -> bool:
+        # QoS 1 acknowledgment - just log for now
+        logger.debug("Received PUBACK")
+        return True
+    
+    async def _dispatch_pubrec(self, reader, writer, client, msg_type, remaining_length) -> bool:
+        # QoS 2 flow - handle PUBREC
+        await self._handle_pubrec(reader, writer, client, remaining_length)
+        return True
+    
+    async def _dispatch_pubrel(self, reader, writer, client, msg_type, remaining_length) -> bool:
+        # QoS 2 flow - handle PUBREL
+        await self._handle_pubrel(reader, writer, client, remaining_length)
+        return True
+    
+    async def _dispatch_pubcomp(self, reader, writer, client, msg_type, remaining_length) -> bool:
+        # QoS 2 flow - just log for now
+        logger.debug("Received PUBCOMP")
+        return True
+    
+    # Indexed by the full fixed-header byte; None means unsupported
+    _dispatch_table = [None] * 256
+    for _flags in range(16):
+        # PUBLISH carries DUP/QoS/RETAIN in the low nibble
+        _dispatch_table[MQTTMessageType.PUBLISH | _flags] = _dispatch_publish
+    _dispatch_table[MQTTMessageType.SUBSCRIBE] = _dispatch_subscribe
+    _dispatch_table[MQTTMessageType.PINGREQ] = _dispatch_pingreq
+    _dispatch_table[MQTTMessageType.UNSUBSCRIBE] = _dispatch_unsubscribe
+    _dispatch_table[MQTTMessageType.DISCONNECT] = _dispatch_disconnect
+    _dispatch_table[MQTTMessageType.PUBACK] = _dispatch_puback
+    _dispatch_table[MQTTMessageType.PUBREC] = _dispatch_pubrec
+    _dispatch_table[MQTTMessageType.PUBREL] = _dispatch_pubrel
+    _dispatch_table[MQTTMessageType.PUBCOMP] = _dispatch_pubcomp
+    _PACKET_DISPATCH: Tuple[Optional[Callable], ...] = tuple(_dispatch_table)
+    del _dispatch_table, _flags
+    
     async def _handle_pingreq(self, writer: asyncio.StreamWriter):
         """Handle PINGREQ message - send PINGRESP"""
         try:
@@ -1389,6 +1442,7 @@ class MQTTApp:
                     publish_msg = MQTTProtocol.build_publish(topic, payload, None, delivery_qos, retain=True)
                     writer.write(publish_msg)
                     await writer.drain()
+                    self._metrics['total_messages_forwarded'] += 1
                     logger.debug(f"Delivered retained message for topic: {topic} to subscriber")
                 except Exception as e:
                     logger.error(f"Error delivering retained message: {e}")
@@ -1433,15 +1487,27 @@ class MQTTApp:
             - current_connections: Current active connections
             - total_messages_published: Total PUBLISH messages received
             - total_messages_received: Same as published (alias)
+            - total_messages_forwarded: PUBLISH packets sent to subscribers,
+              including retained messages delivered on subscribe
             - total_subscriptions: Total subscriptions created
             - total_unsubscriptions: Total unsubscriptions
             - retained_messages_count: Number of retained messages
             - active_subscriptions_count: Number of active topic subscriptions
+            - connections_per_ip: Connections per client IP (refreshed at most
+              every METRICS_SNAPSHOT_INTERVAL seconds)
+        
+        Scalar metrics are running counters; connections_per_ip is copied from
+        a snapshot of the live table, so it is not rebuilt on every call.
         """
+        now = time.monotonic()
+        if now - self._metrics_snapshot_time >= self.METRICS_SNAPSHOT_INTERVAL:
+            self._connections_per_ip_snapshot = dict(self._connections_per_ip)
+            self._metrics_snapshot_time = now
+        
         metrics = self._metrics.copy()
         metrics['retained_messages_count'] = len(self._retained_messages)
         metrics['active_subscriptions_count'] = len(self._topic_subscriptions)
-        metrics['connections_per_ip'] = dict(self._connections_per_ip)
+        metrics['connections_per_ip'] = dict(self._connections_per_ip_snapshot)
         return metrics
     
     def health_check(self) -> Dict[str, Any]:
@@ -1489,6 +1555,7 @@ class MQTTApp:
         """
         logger.info("Starting graceful shutdown...")
         self._running = False
+        self.ready.clear()
         
         # Set shutdown event
         if self._shutdown_event:
@@ -1578,6 +1645,8 @@ class MQTTApp:
             protocol = "MQTTS" if self.ssl_context else "MQTT"
             logger.info(f"{protocol} server listening on {self.host}:{self.port}")
         
+        self.ready.set()
+        
         # Log routing mode
         if self.use_redis and self._redis_client:
             logger.info("Redis pub/sub backend: ENABLED (for multi-server scaling)")
@@ -1622,7 +1691,7 @@ class MQTTApp:
         self._running = True
         
         try:
-            asyncio.run(self._start_server())
+            self._run_loop(self._start_server())
         except KeyboardInterrupt:
             logger.info("Server stopped by user")
         finally:
@@ -1630,10 +1699,21 @@ class MQTTApp:
             # Ensure Redis is disconnected
             if self._redis_client:
                 try:
-                    asyncio.run(self._disconnect_redis())
+                    self._run_loop(self._disconnect_redis())
                 except Exception as e:
                     logger.error(f"Error disconnecting Redis: {e}")
     
+    def _run_loop(self, coro):
+        """Run a coroutine to completion on a new event loop (uvloop if enabled)"""
+        if not self.enable_uvloop:
+            return asyncio.run(coro)
+        if hasattr(asyncio, 'Runner'):
+            # Python 3.11+: pick the loop without touching the global policy
+            with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+                return runner.run(coro)
+        uvloop.install()
+        return asyncio.run(coro)
+    
     async def _session_cleanup_task(self):
         """Periodically clean up expired sessions"""
         while self._running:
@@ -5,12 +5,16 @@ Based on curl's curl_ngtcp2.c reference implementation
 This module provides Python ctypes bindings for the ngtcp2 C library.
 Compatible with no-GIL Python.
 
+The bindings use ctypes in ABI mode on purpose: the package installs as pure
+Python, without ngtcp2 headers or a C compiler at build time.
+
 Reference:
 - curl/lib/vquic/curl_ngtcp2.c
 - ngtcp2 API: https://nghttp2.org/ngtcp2/
 """
 
 import ctypes
+import functools
 from ctypes import (
     CDLL, Structure, POINTER, CFUNCTYPE, byref,
     c_int, c_int32, c_int64, c_uint8, c_uint16, c_uint32, c_uint64,
@@ -410,6 +414,7 @@ except Exception as e:
 _load_ngtcp2_library()
 
 
+@functools.lru_cache(maxsize=1)
 def get_ngtcp2_lib():
     """Get the loaded ngtcp2 library, or None if not available"""
     if not NGTCP2_AVAILABLE:
@@ -446,7 +451,6 @@ if NGTCP2_AVAILABLE and _ngtcp2_lib:
         # Use manual initialization instead to avoid crashes
         def _settings_default_wrapper(settings_ptr):
             """Manually initialize settings to avoid ngtcp2_settings_default crash"""
-            import ctypes
             # Zero out the structure
             ctypes.memset(settings_ptr, 0, ctypes.sizeof(ngtcp2_settings))
             # Get the settings object
@@ -488,7 +492,6 @@ if NGTCP2_AVAILABLE and _ngtcp2_lib:
         # WORKAROUND: Same crash issue as settings_default - use manual initialization
         def _transport_params_default_wrapper(params_ptr):
             """Manually initialize transport params to avoid crash"""
-            import ctypes
             # Zero out the structure
             ctypes.memset(params_ptr, 0, ctypes.sizeof(ngtcp2_transport_params))
             # Get the params object
@@ -963,6 +966,50 @@ else:
     ngtcp2_conn_del = None
 
 
+@functools.lru_cache(maxsize=1)
+def _settings_template() -> ngtcp2_settings:
+    """Default settings, computed once (TLS must be initialized before the first call)"""
+    settings = ngtcp2_settings()
+    try:
+        if ngtcp2_settings_default:
+            ngtcp2_settings_default(byref(settings))
+            return settings
+    except (SystemError, OSError, RuntimeError, AttributeError) as e:
+        logger.debug(f"ngtcp2_settings_default failed, using manual initialization: {e}")
+    
+    # Manual defaults (minimal required fields, matching ngtcp2 defaults)
+    ctypes.memset(byref(settings), 0, ctypes.sizeof(ngtcp2_settings))
+    settings.cc_algo = 0  # NGTCP2_CC_ALGO_CUBIC
+    settings.initial_rtt = NGTCP2_DEFAULT_INITIAL_RTT
+    settings.ack_thresh = 2
+    settings.max_tx_udp_payload_size = 1452  # 1500 - 48 (UDP header)
+    return settings
+
+
+@functools.lru_cache(maxsize=1)
+def _transport_params_template() -> ngtcp2_transport_params:
+    """Default transport params, computed once"""
+    params = ngtcp2_transport_params()
+    if ngtcp2_transport_params_default:
+        ngtcp2_transport_params_default(byref(params))
+    return params
+
+
+def make_settings() -> ngtcp2_settings:
+    """
+    Return a new ngtcp2_settings initialized to the defaults.
+    
+    ngtcp2_settings_default is called once for a template; each call after
+    that is a plain memory copy instead of an FFI round trip.
+    """
+    return ngtcp2_settings.from_buffer_copy(_settings_template())
+
+
+def make_transport_params() -> ngtcp2_transport_params:
+    """Return a new ngtcp2_transport_params initialized to the defaults (copied from a template)"""
+    return ngtcp2_transport_params.from_buffer_copy(_transport_params_template())
+
+
 def verify_bindings() -> bool:
     """Verify that essential bindings are available"""
     if not NGTCP2_AVAILABLE:
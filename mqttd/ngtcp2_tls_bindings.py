@@ -55,6 +55,7 @@ USE_WOLFSSL = False
 _openssl_lib = None
 _wolfssl_lib = None
 _ngtcp2_crypto_lib = None
+_ngtcp2_crypto_probed = False  # Set after the first search so failed lookups aren't repeated
 
 OPENSSL_AVAILABLE = False
 WOLFSSL_AVAILABLE = False
@@ -128,10 +129,11 @@ def _load_wolfssl_library():
 
 def _load_ngtcp2_crypto_library():
     """Load ngtcp2 crypto library (OpenSSL or wolfSSL backend)"""
-    global _ngtcp2_crypto_lib, NGTCP2_CRYPTO_AVAILABLE, USE_OPENSSL, USE_WOLFSSL
+    global _ngtcp2_crypto_lib, _ngtcp2_crypto_probed, NGTCP2_CRYPTO_AVAILABLE, USE_OPENSSL, USE_WOLFSSL
     
-    if _ngtcp2_crypto_lib is not None:
+    if _ngtcp2_crypto_lib is not None or _ngtcp2_crypto_probed:
         return NGTCP2_CRYPTO_AVAILABLE
+    _ngtcp2_crypto_probed = True
     
     # Try to determine which TLS backend ngtcp2 was built with
     # Based on curl's implementation, we check for specific symbols
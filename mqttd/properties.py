@@ -6,7 +6,8 @@ Reference: https://docs.oasis-open.org/mqtt/mqtt/v5.0/mqtt-v5.0.html
 """
 
 import struct
-from typing import Dict, Any, List, Optional, Tuple
+from functools import lru_cache
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from enum import IntEnum
 
 
@@ -82,9 +83,42 @@ class PropertyEncoder:
         Returns:
             Encoded properties bytes
         """
+        items = tuple(sorted(properties.items()))
+        if _SCALAR_PROPS.issuperset(properties):
+            return _encode_items_cached(items)
+        # Strings and binary data (credentials, correlation data) are not cached
+        return PropertyEncoder._encode_items(items)
+    
+    @staticmethod
+    def encode_properties_fast(properties: Dict[int, Any]) -> bytes:
+        """
+        Encode properties with an encoder specialized on the set of property IDs.
+        
+        Publishers tend to send the same few properties on every PUBLISH, so a
+        straight-line encoder is generated once per shape and reused. Output is
+        identical to encode_properties().
+        
+        Args:
+            properties: Dictionary mapping PropertyType to value
+            
+        Returns:
+            Encoded properties bytes
+        """
+        shape = tuple(sorted(properties))
+        encoder = _SHAPE_CACHE.get(shape)
+        if encoder is None:
+            if len(_SHAPE_CACHE) >= _SHAPE_CACHE_MAX:
+                # Cache full: don't compile an encoder that would be thrown away
+                return PropertyEncoder.encode_properties(properties)
+            encoder = _build_shape_encoder(shape)
+        return encoder(properties)
+    
+    @staticmethod
+    def _encode_items(items: Tuple[Tuple[int, Any], ...]) -> bytes:
+        """Encode sorted (property id, value) pairs to bytes"""
         result = bytearray()
         
-        for prop_id, value in sorted(properties.items()):
+        for prop_id, value in items:
             # Handle subscription identifier list specially (can have multiple entries)
             if prop_id == PropertyType.SUBSCRIPTION_IDENTIFIER and isinstance(value, list):
                 for sub_id in value:
@@ -413,3 +447,98 @@ class PropertyEncoder:
                 break
         
         return value, bytes_consumed
+
+
+# Value layout of each property, used to generate shape-specialized encoders
+_BYTE_PROPS = (
+    PropertyType.PAYLOAD_FORMAT_INDICATOR, PropertyType.REQUEST_PROBLEM_INFORMATION,
+    PropertyType.REQUEST_RESPONSE_INFORMATION, PropertyType.MAXIMUM_QOS,
+    PropertyType.RETAIN_AVAILABLE, PropertyType.WILDCARD_SUBSCRIPTION_AVAILABLE,
+    PropertyType.SUBSCRIPTION_IDENTIFIER_AVAILABLE, PropertyType.SHARED_SUBSCRIPTION_AVAILABLE,
+)
+_TWO_BYTE_PROPS = (
+    PropertyType.SERVER_KEEP_ALIVE, PropertyType.RECEIVE_MAXIMUM,
+    PropertyType.TOPIC_ALIAS_MAXIMUM, PropertyType.TOPIC_ALIAS,
+)
+_FOUR_BYTE_PROPS = (
+    PropertyType.MESSAGE_EXPIRY_INTERVAL, PropertyType.SESSION_EXPIRY_INTERVAL,
+    PropertyType.WILL_DELAY_INTERVAL, PropertyType.MAXIMUM_PACKET_SIZE,
+)
+_STRING_PROPS = (
+    PropertyType.CONTENT_TYPE, PropertyType.RESPONSE_TOPIC,
+    PropertyType.ASSIGNED_CLIENT_IDENTIFIER, PropertyType.AUTHENTICATION_METHOD,
+    PropertyType.RESPONSE_INFORMATION, PropertyType.SERVER_REFERENCE,
+    PropertyType.REASON_STRING,
+)
+_BINARY_PROPS = (PropertyType.CORRELATION_DATA, PropertyType.AUTHENTICATION_DATA)
+
+_SHAPE_CACHE: Dict[Tuple[int, ...], Callable[[Dict[int, Any]], bytes]] = {}
+_SHAPE_CACHE_MAX = 256
+
+_SHAPE_NAMESPACE = {
+    '_pack_H': struct.Struct('>H').pack,
+    '_pack_I': struct.Struct('>I').pack,
+    '_encode_string': PropertyEncoder._encode_string,
+    '_encode_vbi': PropertyEncoder._encode_variable_byte_integer,
+}
+
+
+def _property_source(prop_id: int) -> Optional[List[str]]:
+    """Source lines appending property prop_id (value in v) to out, or None if unknown"""
+    if prop_id in _BYTE_PROPS:
+        body = ["out.append(int(v))"]
+    elif prop_id in _TWO_BYTE_PROPS:
+        body = ["out += _pack_H(v)"]
+    elif prop_id in _FOUR_BYTE_PROPS:
+        body = ["out += _pack_I(v)"]
+    elif prop_id in _STRING_PROPS:
+        body = ["out += _encode_string(v)"]
+    elif prop_id in _BINARY_PROPS:
+        body = ["out += _pack_H(len(v)) + v"]
+    elif prop_id == PropertyType.SUBSCRIPTION_IDENTIFIER:
+        # One property entry per subscription ID
+        return [
+            f"v = p[{prop_id}]",
+            "if isinstance(v, list):",
+            "    for sub_id in v:",
+            f"        out.append({prop_id})",
+            "        out += _encode_vbi(sub_id)",
+            "else:",
+            f"    out.append({prop_id})",
+            "    out += _encode_vbi(v)",
+        ]
+    elif prop_id == PropertyType.USER_PROPERTY:
+        body = [
+            "if isinstance(v, (list, tuple)) and len(v) == 2:",
+            "    out += _encode_string(v[0])",
+            "    out += _encode_string(v[1])",
+            "else:",
+            "    raise ValueError(f'USER_PROPERTY must be a (name, value) pair, got {v}')",
+        ]
+    else:
+        return None
+    return [f"v = p[{prop_id}]", f"out.append({prop_id})"] + body
+
+
+def _build_shape_encoder(shape: Tuple[int, ...]) -> Callable[[Dict[int, Any]], bytes]:
+    """Generate (and cache) an encoder for dicts whose sorted keys are exactly shape"""
+    lines = ["def encode(p):", "    out = bytearray()"]
+    for prop_id in shape:
+        source = _property_source(int(prop_id))
+        if source is None:
+            # Unknown property: let the generic encoder raise its usual error
+            return PropertyEncoder.encode_properties
+        lines.extend("    " + line for line in source)
+    lines.append("    return bytes(out)")
+    
+    namespace = dict(_SHAPE_NAMESPACE)
+    exec("\n".join(lines), namespace)
+    encoder = namespace['encode']
+    _SHAPE_CACHE[shape] = encoder
+    return encoder
+
+
+# Bundles of integer properties repeat (CONNACK limits, expiry intervals), so
+# their encodings are memoized; anything carrying strings or binary data is not
+_SCALAR_PROPS = frozenset(_BYTE_PROPS + _TWO_BYTE_PROPS + _FOUR_BYTE_PROPS)
+_encode_items_cached = lru_cache(maxsize=1024)(PropertyEncoder._encode_items)
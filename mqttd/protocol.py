@@ -7,6 +7,8 @@ Reference: https://docs.oasis-open.org/mqtt/mqtt/v5.0/mqtt-v5.0.html
 """
 
 import struct
+import sys
+from functools import lru_cache
 from typing import Tuple, Optional, Dict, Any, List
 from enum import IntEnum
 
@@ -19,6 +21,30 @@ except ImportError:
     PropertyType = None
     ReasonCode = None
 
+_PACK_H_INTO = struct.Struct('>H').pack_into
+_UNPACK_H_FROM = struct.Struct('>H').unpack_from
+_PACK_ACK = struct.Struct('>BBH').pack
+
+# Continuation bits / whole bytes of an n-byte little-endian remaining-length word
+_REM_LEN_MSB_MASKS = (0, 0x80, 0x8080, 0x808080, 0x80808080)
+_REM_LEN_BYTE_MASKS = (0, 0xFF, 0xFFFF, 0xFFFFFF, 0xFFFFFFFF)
+
+# Strings longer than this are encoded uncached, so the cache stays small
+# even when clients send huge topics or client IDs
+ENCODE_STRING_CACHE_MAX_LEN = 256
+
+
+def _encode_utf8_string(s: str) -> bytes:
+    """Encode a string as MQTT format: 2-byte length + UTF-8 bytes (uncached)"""
+    utf8_bytes = s.encode('utf-8')
+    return struct.pack('>H', len(utf8_bytes)) + utf8_bytes
+
+
+_encode_string_cached = lru_cache(maxsize=16384)(_encode_utf8_string)
+
+# Single-byte remaining lengths (0-127) cover pings, acks and most small packets
+_REM_LEN_TABLE = tuple(bytes((i,)) for i in range(128))
+
 
 class MQTTMessageType(IntEnum):
     """MQTT message types"""
@@ -38,6 +64,12 @@ class MQTTMessageType(IntEnum):
     DISCONNECT = 0xE0
 
 
+# Fixed-size control packets, built once at import
+_PINGREQ = bytes([MQTTMessageType.PINGREQ, 0])
+_PINGRESP = bytes([MQTTMessageType.PINGRESP, 0])
+_DISCONNECT = bytes([MQTTMessageType.DISCONNECT, 0])
+
+
 class MQTTConnectFlags:
     """MQTT CONNECT flags"""
     USERNAME = 0x80
@@ -80,22 +112,20 @@ class MQTTProtocol:
         Returns:
             Encoded bytes (1-4 bytes)
         """
+        if 0 <= length < 128:
+            return _REM_LEN_TABLE[length]
         if length < 0 or length > 268435455:
             raise ValueError(f"Invalid remaining length: {length}")
         
-        encoded = bytearray()
-        while True:
-            encoded_byte = length % 128
-            length //= 128
-            if length > 0:
-                encoded_byte |= 0x80
-            encoded.append(encoded_byte)
-            if length == 0:
-                break
-            if len(encoded) >= 4:
-                raise ValueError("Remaining length too large")
-        
-        return bytes(encoded)
+        # One straight-line encoding per length class instead of a loop
+        bits = length.bit_length()
+        if bits <= 14:
+            return bytes(((length & 0x7F) | 0x80, length >> 7))
+        if bits <= 21:
+            return bytes(((length & 0x7F) | 0x80, ((length >> 7) & 0x7F) | 0x80,
+                          length >> 14))
+        return bytes(((length & 0x7F) | 0x80, ((length >> 7) & 0x7F) | 0x80,
+                      ((length >> 14) & 0x7F) | 0x80, length >> 21))
     
     @staticmethod
     def decode_remaining_length(data: bytes, offset: int = 0) -> Tuple[int, int]:
@@ -109,26 +139,41 @@ class MQTTProtocol:
         Returns:
             Tuple of (decoded_length, bytes_consumed)
         """
-        length = 0
-        multiplier = 1
-        bytes_consumed = 0
-        
-        for i in range(offset, min(offset + 4, len(data))):
-            encoded = data[i]
-            length += (encoded & 0x7F) * multiplier
-            multiplier *= 128
-            bytes_consumed += 1
-            
-            if not (encoded & 0x80):
-                break
-        
-        return length, bytes_consumed
+        end = min(offset + 4, len(data))
+        if offset >= end:
+            return 0, 0
+        
+        # Fast path: single-byte length
+        encoded = data[offset]
+        if not (encoded & 0x80):
+            return encoded, 1
+        
+        # Load up to 4 bytes as one little-endian word and find the first byte
+        # with a clear continuation bit via its lowest set bit (SWAR)
+        consumed = end - offset
+        word = int.from_bytes(data[offset:end], 'little')
+        stop = ~word & _REM_LEN_MSB_MASKS[consumed]
+        if stop:
+            consumed = (stop & -stop).bit_length() >> 3
+            word &= _REM_LEN_BYTE_MASKS[consumed]
+        
+        # Gather the 7-bit groups of each byte into place
+        length = ((word & 0x7F) | ((word >> 1) & 0x3F80) |
+                  ((word >> 2) & 0x1FC000) | ((word >> 3) & 0xFE00000))
+        return length, consumed
     
     @staticmethod
     def encode_string(s: str) -> bytes:
-        """Encode a string as MQTT format: 2-byte length + UTF-8 bytes"""
-        utf8_bytes = s.encode('utf-8')
-        return struct.pack('>H', len(utf8_bytes)) + utf8_bytes
+        """
+        Encode a string as MQTT format: 2-byte length + UTF-8 bytes
+        
+        Strings up to ENCODE_STRING_CACHE_MAX_LEN characters are cached: topics
+        and client IDs are encoded over and over. Do not pass credentials
+        through here; use _encode_utf8_string for those.
+        """
+        if len(s) <= ENCODE_STRING_CACHE_MAX_LEN:
+            return _encode_string_cached(s)
+        return _encode_utf8_string(s)
     
     @staticmethod
     def decode_string(data: bytes, offset: int = 0) -> Tuple[str, int]:
@@ -136,27 +181,21 @@ class MQTTProtocol:
         if offset + 2 > len(data):
             raise ValueError("Insufficient data for string length")
         
-        str_len = struct.unpack('>H', data[offset:offset+2])[0]
+        (str_len,) = _UNPACK_H_FROM(data, offset)
         offset += 2
+        end = offset + str_len
         
-        if offset + str_len > len(data):
+        if end > len(data):
             raise ValueError("Insufficient data for string content")
         
-        string = data[offset:offset+str_len].decode('utf-8')
-        return string, offset + str_len
+        # str() accepts bytes, bytearray and memoryview slices alike
+        return str(data[offset:end], 'utf-8'), end
     
     @staticmethod
     def build_connect(client_id: str, username: Optional[str] = None,
                      password: Optional[str] = None, keepalive: int = 60,
                      clean_session: bool = True) -> bytes:
         """Build a CONNECT message (MQTT 3.1.1)"""
-        # Fixed header
-        msg_type = MQTTMessageType.CONNECT
-        
-        # Variable header
-        protocol_name = MQTTProtocol.encode_string("MQTT")
-        protocol_level = bytes([MQTTProtocol.PROTOCOL_LEVEL_3_1_1])
-        
         # Connect flags
         connect_flags = 0x00
         if clean_session:
@@ -166,54 +205,63 @@ class MQTTProtocol:
         if password:
             connect_flags |= MQTTConnectFlags.PASSWORD
         
-        keepalive_bytes = struct.pack('>H', keepalive)
-        
-        # Payload
-        payload = MQTTProtocol.encode_string(client_id)
+        # Payload strings, in wire order
+        fields = [client_id.encode('utf-8')]
         if username:
-            payload += MQTTProtocol.encode_string(username)
+            fields.append(username.encode('utf-8'))
         if password:
-            payload += MQTTProtocol.encode_string(password)
-        
-        # Variable header
-        variable_header = protocol_name + protocol_level + bytes([connect_flags]) + keepalive_bytes
+            fields.append(password.encode('utf-8'))
         
-        # Remaining length
-        remaining_length = len(variable_header) + len(payload)
+        # Variable header: protocol name (6) + level (1) + flags (1) + keepalive (2)
+        remaining_length = 10 + sum(2 + len(f) for f in fields)
         remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
+        offset = 1 + len(remaining_length_bytes)
+        
+        # Size the packet once and fill it in place
+        buf = bytearray(offset + remaining_length)
+        buf[0] = MQTTMessageType.CONNECT
+        buf[1:offset] = remaining_length_bytes
+        buf[offset:offset + 6] = b'\x00\x04MQTT'
+        buf[offset + 6] = MQTTProtocol.PROTOCOL_LEVEL_3_1_1
+        buf[offset + 7] = connect_flags
+        _PACK_H_INTO(buf, offset + 8, keepalive)
+        offset += 10
+        for field in fields:
+            _PACK_H_INTO(buf, offset, len(field))
+            offset += 2
+            buf[offset:offset + len(field)] = field
+            offset += len(field)
         
-        # Fixed header
-        fixed_header = bytes([msg_type]) + remaining_length_bytes
-        
-        return fixed_header + variable_header + payload
+        return bytes(buf)
     
     @staticmethod
+    @lru_cache(maxsize=256)
     def build_connack(return_code: int = MQTTConnAckCode.ACCEPTED) -> bytes:
         """Build a CONNACK message (MQTT 3.1.1)"""
-        msg_type = MQTTMessageType.CONNACK
-        remaining_length = 2
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
-        
-        # Variable header: Connect Acknowledge Flags (1 byte) + Return Code (1 byte)
-        variable_header = bytes([0x00, return_code])
-        
-        return bytes([msg_type]) + remaining_length_bytes + variable_header
+        # Fixed header + Connect Acknowledge Flags (1 byte) + Return Code (1 byte)
+        return bytes([MQTTMessageType.CONNACK, 2, 0x00, return_code])
     
     @staticmethod
     def build_subscribe(packet_id: int, topic: str, qos: int = 0) -> bytes:
         """Build a SUBSCRIBE message"""
         msg_type = MQTTMessageType.SUBSCRIBE | 0x02  # QoS 1 required for SUBSCRIBE
+        topic_bytes = topic.encode('utf-8')
         
-        # Variable header: Packet Identifier
-        variable_header = struct.pack('>H', packet_id)
-        
-        # Payload: Topic + QoS
-        payload = MQTTProtocol.encode_string(topic) + bytes([qos])
-        
-        remaining_length = len(variable_header) + len(payload)
+        # Packet Identifier (2) + Topic (2 + len) + QoS (1)
+        remaining_length = 5 + len(topic_bytes)
         remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
-        
-        return bytes([msg_type]) + remaining_length_bytes + variable_header + payload
+        offset = 1 + len(remaining_length_bytes)
+        
+        buf = bytearray(offset + remaining_length)
+        buf[0] = msg_type
+        buf[1:offset] = remaining_length_bytes
+        _PACK_H_INTO(buf, offset, packet_id)
+        _PACK_H_INTO(buf, offset + 2, len(topic_bytes))
+        offset += 4
+        buf[offset:offset + len(topic_bytes)] = topic_bytes
+        buf[-1] = qos
+        
+        return bytes(buf)
     
     @staticmethod
     def build_suback(packet_id: int, return_code: int = 0) -> bytes:
@@ -237,77 +285,81 @@ class MQTTProtocol:
         if retain:
             msg_type |= 0x01
         
-        # Variable header: Topic
-        variable_header = MQTTProtocol.encode_string(topic)
+        topic_bytes = topic.encode('utf-8')
+        topic_len = len(topic_bytes)
         
         # Packet ID for QoS > 0
-        if qos > 0 and packet_id is not None:
-            variable_header += struct.pack('>H', packet_id)
-        
-        # Payload
-        full_payload = variable_header + payload
+        has_packet_id = qos > 0 and packet_id is not None
         
-        remaining_length = len(full_payload)
+        remaining_length = 2 + topic_len + (2 if has_packet_id else 0) + len(payload)
         remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
+        offset = 1 + len(remaining_length_bytes)
+        
+        # Size the packet once; the payload is copied in a single slice assignment
+        buf = bytearray(offset + remaining_length)
+        buf[0] = msg_type
+        buf[1:offset] = remaining_length_bytes
+        _PACK_H_INTO(buf, offset, topic_len)
+        offset += 2
+        buf[offset:offset + topic_len] = topic_bytes
+        offset += topic_len
+        if has_packet_id:
+            _PACK_H_INTO(buf, offset, packet_id)
+            offset += 2
+        buf[offset:] = payload
         
-        return bytes([msg_type]) + remaining_length_bytes + full_payload
+        return bytes(buf)
     
     @staticmethod
     def build_disconnect() -> bytes:
         """Build a DISCONNECT message"""
-        msg_type = MQTTMessageType.DISCONNECT
-        remaining_length = 0
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
-        
-        return bytes([msg_type]) + remaining_length_bytes
+        return _DISCONNECT
     
     @staticmethod
     def build_pingreq() -> bytes:
         """Build a PINGREQ message"""
-        msg_type = MQTTMessageType.PINGREQ
-        remaining_length = 0
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
-        
-        return bytes([msg_type]) + remaining_length_bytes
+        return _PINGREQ
     
     @staticmethod
     def build_pingresp() -> bytes:
         """Build a PINGRESP message"""
-        msg_type = MQTTMessageType.PINGRESP
-        remaining_length = 0
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
-        
-        return bytes([msg_type]) + remaining_length_bytes
+        return _PINGRESP
     
     @staticmethod
     def build_unsubscribe(packet_id: int, topics: List[str]) -> bytes:
         """Build an UNSUBSCRIBE message"""
         msg_type = MQTTMessageType.UNSUBSCRIBE | 0x02  # QoS 1 required for UNSUBSCRIBE
         
-        # Variable header: Packet Identifier
-        variable_header = struct.pack('>H', packet_id)
-        
         # Payload: Topics (list of strings)
-        payload = b''
-        for topic in topics:
-            payload += MQTTProtocol.encode_string(topic)
+        encoded_topics = [topic.encode('utf-8') for topic in topics]
         
-        remaining_length = len(variable_header) + len(payload)
+        remaining_length = 2 + sum(2 + len(t) for t in encoded_topics)
         remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
+        offset = 1 + len(remaining_length_bytes)
+        
+        buf = bytearray(offset + remaining_length)
+        buf[0] = msg_type
+        buf[1:offset] = remaining_length_bytes
+        _PACK_H_INTO(buf, offset, packet_id)
+        offset += 2
+        for topic_bytes in encoded_topics:
+            _PACK_H_INTO(buf, offset, len(topic_bytes))
+            offset += 2
+            buf[offset:offset + len(topic_bytes)] = topic_bytes
+            offset += len(topic_bytes)
         
-        return bytes([msg_type]) + remaining_length_bytes + variable_header + payload
+        return bytes(buf)
     
     @staticmethod
     def build_unsuback(packet_id: int) -> bytes:
         """Build an UNSUBACK message (MQTT 3.1.1)"""
-        msg_type = MQTTMessageType.UNSUBACK
-        remaining_length = 2
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
-        
-        # Variable header: Packet Identifier
-        variable_header = struct.pack('>H', packet_id)
+        # Fixed header (type + remaining length 2) + Packet Identifier
+        buf = bytearray(4)
+        buf[0] = MQTTMessageType.UNSUBACK
+        buf[1] = 2
+        _PACK_H_INTO(buf, 2, packet_id)
         
-        return bytes([msg_type]) + remaining_length_bytes + variable_header
+        return bytes(buf)
     
     @staticmethod
     def parse_unsubscribe(data: bytes) -> Dict[str, Any]:
@@ -317,7 +369,7 @@ class MQTTProtocol:
         # Packet ID
         if offset + 2 > len(data):
             raise ValueError("Insufficient data for packet ID")
-        packet_id = struct.unpack('>H', data[offset:offset+2])[0]
+        (packet_id,) = _UNPACK_H_FROM(data, offset)
         offset += 2
         
         # Topics (list of strings)
@@ -332,52 +384,29 @@ class MQTTProtocol:
         }
     
     @staticmethod
+    @lru_cache(maxsize=4096)
     def build_puback(packet_id: int) -> bytes:
         """Build a PUBACK message"""
-        msg_type = MQTTMessageType.PUBACK
-        remaining_length = 2
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
-        
-        # Variable header: Packet Identifier
-        variable_header = struct.pack('>H', packet_id)
-        
-        return bytes([msg_type]) + remaining_length_bytes + variable_header
+        return _PACK_ACK(MQTTMessageType.PUBACK, 2, packet_id)
     
     @staticmethod
+    @lru_cache(maxsize=4096)
     def build_pubrec(packet_id: int) -> bytes:
         """Build a PUBREC message (QoS 2 flow)"""
-        msg_type = MQTTMessageType.PUBREC
-        remaining_length = 2
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
-        
-        # Variable header: Packet Identifier
-        variable_header = struct.pack('>H', packet_id)
-        
-        return bytes([msg_type]) + remaining_length_bytes + variable_header
+        return _PACK_ACK(MQTTMessageType.PUBREC, 2, packet_id)
     
     @staticmethod
+    @lru_cache(maxsize=4096)
     def build_pubrel(packet_id: int) -> bytes:
         """Build a PUBREL message (QoS 2 flow)"""
-        msg_type = MQTTMessageType.PUBREL | 0x02  # QoS 1 required for PUBREL
-        remaining_length = 2
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
-        
-        # Variable header: Packet Identifier
-        variable_header = struct.pack('>H', packet_id)
-        
-        return bytes([msg_type]) + remaining_length_bytes + variable_header
+        # QoS 1 required for PUBREL
+        return _PACK_ACK(MQTTMessageType.PUBREL | 0x02, 2, packet_id)
     
     @staticmethod
+    @lru_cache(maxsize=4096)
     def build_pubcomp(packet_id: int) -> bytes:
         """Build a PUBCOMP message (QoS 2 flow)"""
-        msg_type = MQTTMessageType.PUBCOMP
-        remaining_length = 2
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
-        
-        # Variable header: Packet Identifier
-        variable_header = struct.pack('>H', packet_id)
-        
-        return bytes([msg_type]) + remaining_length_bytes + variable_header
+        return _PACK_ACK(MQTTMessageType.PUBCOMP, 2, packet_id)
     
     @staticmethod
     def parse_fixed_header(data: bytes) -> Tuple[int, int, int]:
@@ -422,7 +451,7 @@ class MQTTProtocol:
         # Keepalive
         if offset + 2 > len(data):
             raise ValueError("Insufficient data for keepalive")
-        keepalive = struct.unpack('>H', data[offset:offset+2])[0]
+        (keepalive,) = _UNPACK_H_FROM(data, offset)
         offset += 2
         
         # For MQTT 5.0, properties come next
@@ -459,7 +488,7 @@ class MQTTProtocol:
         if connect_flags & MQTTConnectFlags.WILL_FLAG:
             will_topic, offset = MQTTProtocol.decode_string(data, offset)
             if offset + 2 <= len(data):
-                will_payload_len = struct.unpack('>H', data[offset:offset+2])[0]
+                (will_payload_len,) = _UNPACK_H_FROM(data, offset)
                 offset += 2
                 if offset + will_payload_len <= len(data):
                     will_payload = data[offset:offset+will_payload_len]
@@ -512,7 +541,7 @@ class MQTTProtocol:
         # Packet ID
         if offset + 2 > len(data):
             raise ValueError("Insufficient data for packet ID")
-        packet_id = struct.unpack('>H', data[offset:offset+2])[0]
+        (packet_id,) = _UNPACK_H_FROM(data, offset)
         offset += 2
         
         # Topic
@@ -534,15 +563,16 @@ class MQTTProtocol:
         """Parse a PUBLISH message"""
         offset = 0
         
-        # Topic
+        # Topic (interned: the same few topics recur across many messages)
         topic, offset = MQTTProtocol.decode_string(data, offset)
+        topic = sys.intern(topic)
         
         # Packet ID (for QoS > 0)
         packet_id = None
         if qos > 0:
             if offset + 2 > len(data):
                 raise ValueError("Insufficient data for packet ID")
-            packet_id = struct.unpack('>H', data[offset:offset+2])[0]
+            (packet_id,) = _UNPACK_H_FROM(data, offset)
             offset += 2
         
         # Payload
@@ -6,15 +6,34 @@ Reference: https://docs.oasis-open.org/mqtt/mqtt/v5.0/mqtt-v5.0.html
 """
 
 import struct
-from typing import Tuple, Optional, Dict, Any, List
-from .protocol import MQTTProtocol, MQTTMessageType, MQTTConnectFlags
+import sys
+from typing import Tuple, Optional, Dict, Any, List, Sequence, Union
+from .protocol import MQTTProtocol, MQTTMessageType, MQTTConnectFlags, _encode_utf8_string
 from .properties import PropertyEncoder, PropertyType
 from .reason_codes import ReasonCode
 
+_PACK_H = struct.Struct('>H').pack
+_UNPACK_H_FROM = struct.Struct('>H').unpack_from
+
 
 class MQTT5Protocol:
     """MQTT 5.0 Protocol handler with full feature support"""
     
+    @staticmethod
+    def _assemble(parts: Sequence[Union[bytes, bytearray, memoryview]]) -> bytes:
+        """Concatenate packet parts into one bytes object with a single allocation"""
+        return b''.join(parts)
+    
+    @staticmethod
+    def _with_fixed_header(msg_type: int, parts: List[bytes]) -> bytes:
+        """Prefix the packet parts with a fixed header and join them in one copy"""
+        remaining_length = sum(map(len, parts))
+        return MQTT5Protocol._assemble([
+            bytes((msg_type,)),
+            MQTTProtocol.encode_remaining_length(remaining_length),
+            *parts,
+        ])
+    
     @staticmethod
     def build_connect_v5(
         client_id: str,
@@ -64,10 +83,6 @@ class MQTT5Protocol:
         # Fixed header
         msg_type = MQTTMessageType.CONNECT
         
-        # Variable header - Protocol Name
-        protocol_name = MQTTProtocol.encode_string("MQTT")
-        protocol_level = bytes([MQTTProtocol.PROTOCOL_LEVEL_5_0])
-        
         # Connect flags (MQTT 5.0)
         connect_flags = 0x00
         if username:
@@ -85,8 +100,6 @@ class MQTT5Protocol:
         if clean_start:
             connect_flags |= 0x02  # Clean Start (bit 1)
         
-        keepalive_bytes = struct.pack('>H', keepalive)
-        
         # Properties
         connect_properties = {}
         if session_expiry_interval is not None:
@@ -117,43 +130,36 @@ class MQTT5Protocol:
         if will_topic and will_properties:
             will_properties_bytes = PropertyEncoder.encode_properties(will_properties)
         
-        # Payload
-        payload = MQTTProtocol.encode_string(client_id)
+        # Variable header: Protocol Name + Level + Flags + Keepalive + Properties
+        parts = [
+            b'\x00\x04MQTT',
+            bytes([MQTTProtocol.PROTOCOL_LEVEL_5_0, connect_flags]),
+            _PACK_H(keepalive),
+            properties_length,
+            properties_bytes,
+            # Payload
+            MQTTProtocol.encode_string(client_id),
+        ]
         
         # Will (if present)
         if will_topic:
             if will_properties:
-                will_props_len = MQTTProtocol.encode_remaining_length(len(will_properties_bytes))
-                payload += will_props_len + will_properties_bytes
+                parts.append(MQTTProtocol.encode_remaining_length(len(will_properties_bytes)))
+                parts.append(will_properties_bytes)
             else:
-                payload += b'\x00'  # Will Properties length = 0
-            payload += MQTTProtocol.encode_string(will_topic)
+                parts.append(b'\x00')  # Will Properties length = 0
+            parts.append(MQTTProtocol.encode_string(will_topic))
             if will_payload:
-                payload += struct.pack('>H', len(will_payload)) + will_payload
+                parts.append(_PACK_H(len(will_payload)))
+                parts.append(will_payload)
         
+        # Credentials are encoded uncached so they never land in encode_string's cache
         if username:
-            payload += MQTTProtocol.encode_string(username)
+            parts.append(_encode_utf8_string(username))
         if password:
-            payload += MQTTProtocol.encode_string(password)
-        
-        # Variable header
-        variable_header = (
-            protocol_name +
-            protocol_level +
-            bytes([connect_flags]) +
-            keepalive_bytes +
-            properties_length +
-            properties_bytes
-        )
-        
-        # Remaining length
-        remaining_length = len(variable_header) + len(payload)
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
-        
-        # Fixed header
-        fixed_header = bytes([msg_type]) + remaining_length_bytes
+            parts.append(_encode_utf8_string(password))
         
-        return fixed_header + variable_header + payload
+        return MQTT5Protocol._with_fixed_header(msg_type, parts)
     
     @staticmethod
     def build_connack_v5(
@@ -253,18 +259,9 @@ class MQTT5Protocol:
         properties_length = MQTTProtocol.encode_remaining_length(len(properties_bytes))
         
         # Variable header
-        variable_header = (
-            bytes([connack_flags]) +
-            bytes([reason_code.value]) +
-            properties_length +
-            properties_bytes
-        )
-        
-        # Remaining length
-        remaining_length = len(variable_header)
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
-        
-        return bytes([msg_type]) + remaining_length_bytes + variable_header
+        parts = [bytes([connack_flags, reason_code.value]), properties_length, properties_bytes]
+        
+        return MQTT5Protocol._with_fixed_header(msg_type, parts)
     
     @staticmethod
     def build_suback_v5(
@@ -276,9 +273,6 @@ class MQTT5Protocol:
         """Build a MQTT 5.0 SUBACK message"""
         msg_type = MQTTMessageType.SUBACK
         
-        # Variable header: Packet Identifier
-        variable_header = struct.pack('>H', packet_id)
-        
         # Properties
         properties = {}
         if reason_string:
@@ -292,16 +286,15 @@ class MQTT5Protocol:
         properties_bytes = PropertyEncoder.encode_properties(properties)
         properties_length = MQTTProtocol.encode_remaining_length(len(properties_bytes))
         
-        # Payload: Reason Codes
-        payload = bytes([rc.value for rc in reason_codes])
-        
-        # Variable header with properties
-        full_variable_header = variable_header + properties_length + properties_bytes
+        # Variable header: Packet Identifier + Properties; Payload: Reason Codes
+        parts = [
+            _PACK_H(packet_id),
+            properties_length,
+            properties_bytes,
+            bytes([rc.value for rc in reason_codes]),
+        ]
         
-        remaining_length = len(full_variable_header) + len(payload)
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
-        
-        return bytes([msg_type]) + remaining_length_bytes + full_variable_header + payload
+        return MQTT5Protocol._with_fixed_header(msg_type, parts)
     
     @staticmethod
     def parse_subscribe_v5(data: bytes) -> Dict[str, Any]:
@@ -321,7 +314,7 @@ class MQTT5Protocol:
         # Packet ID
         if offset + 2 > len(data):
             raise ValueError("Insufficient data for packet ID")
-        packet_id = struct.unpack('>H', data[offset:offset+2])[0]
+        (packet_id,) = _UNPACK_H_FROM(data, offset)
         offset += 2
         
         # Properties length
@@ -408,23 +401,21 @@ class MQTT5Protocol:
         if properties:
             publish_properties.update(properties)
         
-        properties_bytes = PropertyEncoder.encode_properties(publish_properties)
+        properties_bytes = PropertyEncoder.encode_properties_fast(publish_properties)
         properties_length = MQTTProtocol.encode_remaining_length(len(properties_bytes))
         
         # Variable header: Topic (include if present - can be set with alias for first time)
         # If topic_alias is provided but topic is empty/None, then we're using an existing alias
-        variable_header = MQTTProtocol.encode_string(topic) if topic else b''
+        parts = [MQTTProtocol.encode_string(topic) if topic else b'']
         if qos > 0 and packet_id is not None:
-            variable_header += struct.pack('>H', packet_id)
-        variable_header += properties_length + properties_bytes
+            parts.append(_PACK_H(packet_id))
+        parts.append(properties_length)
+        parts.append(properties_bytes)
         
         # Payload
-        full_payload = variable_header + payload
-        
-        remaining_length = len(full_payload)
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
+        parts.append(payload)
         
-        return bytes([msg_type]) + remaining_length_bytes + full_payload
+        return MQTT5Protocol._with_fixed_header(msg_type, parts)
     
     @staticmethod
     def parse_publish_v5(data: bytes, qos: int = 0) -> Dict[str, Any]:
@@ -446,10 +437,11 @@ class MQTT5Protocol:
         # Topic (may be empty if using alias)
         topic = None
         if offset + 2 <= len(data):
-            topic_len = struct.unpack('>H', data[offset:offset+2])[0]
+            (topic_len,) = _UNPACK_H_FROM(data, offset)
             offset += 2
             if topic_len > 0 and offset + topic_len <= len(data):
-                topic = data[offset:offset+topic_len].decode('utf-8')
+                # Interned: the same few topics recur across many messages
+                topic = sys.intern(data[offset:offset+topic_len].decode('utf-8'))
                 offset += topic_len
         
         # Packet ID (for QoS > 0)
@@ -457,7 +449,7 @@ class MQTT5Protocol:
         if qos > 0:
             if offset + 2 > len(data):
                 raise ValueError("Insufficient data for packet ID")
-            packet_id = struct.unpack('>H', data[offset:offset+2])[0]
+            (packet_id,) = _UNPACK_H_FROM(data, offset)
             offset += 2
         
         # Properties length
@@ -528,12 +520,9 @@ class MQTT5Protocol:
         properties_length = MQTTProtocol.encode_remaining_length(len(properties_bytes))
         
         # Variable header: Reason Code + Properties
-        variable_header = bytes([reason_code.value]) + properties_length + properties_bytes
-        
-        remaining_length = len(variable_header)
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
+        parts = [bytes([reason_code.value]), properties_length, properties_bytes]
         
-        return bytes([msg_type]) + remaining_length_bytes + variable_header
+        return MQTT5Protocol._with_fixed_header(msg_type, parts)
     
     @staticmethod
     def build_unsubscribe_v5(
@@ -545,9 +534,6 @@ class MQTT5Protocol:
         """Build a MQTT 5.0 UNSUBSCRIBE message"""
         msg_type = MQTTMessageType.UNSUBSCRIBE | 0x02  # QoS 1 required
         
-        # Variable header: Packet Identifier
-        variable_header = struct.pack('>H', packet_id)
-        
         # Properties
         unsubscribe_properties = {}
         if user_properties:
@@ -561,18 +547,13 @@ class MQTT5Protocol:
         properties_bytes = PropertyEncoder.encode_properties(unsubscribe_properties)
         properties_length = MQTTProtocol.encode_remaining_length(len(properties_bytes))
         
-        # Variable header with properties
-        full_variable_header = variable_header + properties_length + properties_bytes
+        # Variable header: Packet Identifier + Properties
+        parts = [_PACK_H(packet_id), properties_length, properties_bytes]
         
         # Payload: Topics (list of strings)
-        payload = b''
-        for topic in topics:
-            payload += MQTTProtocol.encode_string(topic)
-        
-        remaining_length = len(full_variable_header) + len(payload)
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
+        parts.extend(MQTTProtocol.encode_string(topic) for topic in topics)
         
-        return bytes([msg_type]) + remaining_length_bytes + full_variable_header + payload
+        return MQTT5Protocol._with_fixed_header(msg_type, parts)
     
     @staticmethod
     def build_unsuback_v5(
@@ -584,9 +565,6 @@ class MQTT5Protocol:
         """Build a MQTT 5.0 UNSUBACK message"""
         msg_type = MQTTMessageType.UNSUBACK
         
-        # Variable header: Packet Identifier
-        variable_header = struct.pack('>H', packet_id)
-        
         # Properties
         properties = {}
         if reason_string:
@@ -600,13 +578,12 @@ class MQTT5Protocol:
         properties_bytes = PropertyEncoder.encode_properties(properties)
         properties_length = MQTTProtocol.encode_remaining_length(len(properties_bytes))
         
-        # Variable header with properties
-        full_variable_header = variable_header + properties_length + properties_bytes
-        
-        # Payload: Reason Codes (one per topic)
-        payload = bytes([rc.value for rc in reason_codes])
-        
-        remaining_length = len(full_variable_header) + len(payload)
-        remaining_length_bytes = MQTTProtocol.encode_remaining_length(remaining_length)
+        # Variable header: Packet Identifier + Properties; Payload: Reason Codes (one per topic)
+        parts = [
+            _PACK_H(packet_id),
+            properties_length,
+            properties_bytes,
+            bytes([rc.value for rc in reason_codes]),
+        ]
         
-        return bytes([msg_type]) + remaining_length_bytes + full_variable_header + payload
+        return MQTT5Protocol._with_fixed_header(msg_type, parts)
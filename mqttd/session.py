@@ -6,12 +6,16 @@ Reference: https://docs.oasis-open.org/mqtt/mqtt/v5.0/mqtt-v5.0.html
 """
 
 import time
-from typing import Dict, Set, Optional, Any, Tuple
+from typing import Dict, Set, Optional, Any, Tuple, List
 from dataclasses import dataclass, field
 from enum import IntEnum
 import socket
 
 
+# Highest topic alias a client may use (advertised as Topic Alias Maximum in CONNACK)
+TOPIC_ALIAS_MAXIMUM = 64
+
+
 class SessionState(IntEnum):
     """Session state"""
     ACTIVE = 0
@@ -57,8 +61,10 @@ class Session:
     pending_pubrel: Dict[int, Any] = field(default_factory=dict)
     pending_pubcomp: Dict[int, Any] = field(default_factory=dict)
     
-    # Topic aliases (MQTT 5.0)
-    topic_aliases: Dict[int, str] = field(default_factory=dict)  # Alias -> Topic
+    # Topic aliases (MQTT 5.0), indexed by alias 1..TOPIC_ALIAS_MAXIMUM
+    topic_aliases: List[Optional[str]] = field(
+        default_factory=lambda: [None] * (TOPIC_ALIAS_MAXIMUM + 1)
+    )  # Alias -> Topic
     
     # Will message (if any)
     will_message: Optional[Dict[str, Any]] = None
@@ -102,6 +108,24 @@ class Session:
         self.active_socket = socket_obj
         self.active_writer = writer
     
+    def set_topic_alias(self, alias: int, topic: str) -> bool:
+        """
+        Map a topic alias to a topic.
+        
+        Returns:
+            False if alias is 0 or above TOPIC_ALIAS_MAXIMUM (a protocol error)
+        """
+        if not 0 < alias <= TOPIC_ALIAS_MAXIMUM:
+            return False
+        self.topic_aliases[alias] = topic
+        return True
+    
+    def get_topic_alias(self, alias: int) -> Optional[str]:
+        """Resolve a topic alias, or None if it was never set or is out of range"""
+        if not 0 < alias <= TOPIC_ALIAS_MAXIMUM:
+            return None
+        return self.topic_aliases[alias]
+    
     def add_subscription(self, topic: str, qos: int, subscription_id: Optional[int] = None):
         """Add or update subscription"""
         self.subscriptions[topic] = SessionSubscription(
@@ -107,11 +107,92 @@ class ThreadSafeTopicTrie:
     - Exact match: "sensors/temperature"
     - Single-level wildcard: "sensors/+/room1"
     - Multi-level wildcard: "sensors/#"
+    
+    Topic levels are interned to integer IDs so nodes are keyed by int
+    rather than str; '+' and '#' are always IDs 1 and 2. Each level ID counts
+    the trie nodes keyed by it; levels no node uses any more are dropped from
+    the intern table in batches.
     """
     
+    # Reserved level IDs (0 is never assigned and matches no child)
+    _UNKNOWN_ID = 0
+    _PLUS_ID = 1
+    _HASH_ID = 2
+    _FIRST_LEVEL_ID = 3
+    
+    # Purge unreferenced levels once this many have accumulated
+    _PURGE_THRESHOLD = 1024
+    _LOOKUP_CACHE_MAX = 8192
+    
     def __init__(self):
         self._lock = RLock()
         self._trie: Dict = {}
+        self._intern: Dict[str, int] = {'+': self._PLUS_ID, '#': self._HASH_ID}
+        self._level_refs: Dict[int, int] = {}  # Level ID -> trie nodes keyed by it
+        self._unreferenced = 0
+        self._next_id = self._FIRST_LEVEL_ID
+        self._lookup_cache: Dict[str, Tuple[int, ...]] = {}
+    
+    def _tokenize(self, topic: str) -> Tuple[int, ...]:
+        """Map topic levels to IDs, assigning new IDs as needed (caller holds the lock)"""
+        intern = self._intern
+        ids = []
+        for part in topic.split('/'):
+            level_id = intern.get(part)
+            if level_id is None:
+                # IDs are never reused, so cached lookups stay valid
+                level_id = intern[part] = self._next_id
+                self._next_id += 1
+                self._level_refs[level_id] = 0
+                self._unreferenced += 1
+            ids.append(level_id)
+        return tuple(ids)
+    
+    def _lookup_tokens(self, topic: str) -> Tuple[int, ...]:
+        """Map topic levels to IDs without assigning new ones (caller holds the lock)"""
+        ids = self._lookup_cache.get(topic)
+        if ids is None:
+            get = self._intern.get
+            unknown = self._UNKNOWN_ID
+            ids = tuple(get(part, unknown) for part in topic.split('/'))
+            # A level interned later would change the answer, so only topics
+            # whose levels are all known are cached
+            if unknown not in ids:
+                cache = self._lookup_cache
+                if len(cache) >= self._LOOKUP_CACHE_MAX:
+                    cache.clear()
+                cache[topic] = ids
+        return ids
+    
+    def _acquire_level(self, level_id: int):
+        """Count a new trie node keyed by level_id"""
+        if level_id >= self._FIRST_LEVEL_ID:
+            refs = self._level_refs[level_id]
+            if refs == 0:
+                self._unreferenced -= 1
+            self._level_refs[level_id] = refs + 1
+    
+    def _release_level(self, level_id: int):
+        """Uncount a pruned trie node keyed by level_id"""
+        if level_id >= self._FIRST_LEVEL_ID:
+            refs = self._level_refs[level_id] - 1
+            self._level_refs[level_id] = refs
+            if refs == 0:
+                self._unreferenced += 1
+                if self._unreferenced >= self._PURGE_THRESHOLD:
+                    self._purge_levels()
+    
+    def _purge_levels(self):
+        """Drop levels no trie node uses from the intern table"""
+        refs = self._level_refs
+        dead = {level_id for level_id, count in refs.items() if count == 0}
+        self._intern = {part: level_id for part, level_id in self._intern.items()
+                        if level_id not in dead}
+        for level_id in dead:
+            del refs[level_id]
+        self._unreferenced = 0
+        # Cached lookups may hold purged IDs
+        self._lookup_cache.clear()
     
     def insert(self, topic: str, client_info: Any):
         """
@@ -122,13 +203,14 @@ class ThreadSafeTopicTrie:
             client_info: Client information (socket, writer, etc.)
         """
         with self._lock:
-            parts = topic.split('/')
             node = self._trie
             
-            for part in parts:
-                if part not in node:
-                    node[part] = {}
-                node = node[part]
+            for level_id in self._tokenize(topic):
+                child = node.get(level_id)
+                if child is None:
+                    child = node[level_id] = {}
+                    self._acquire_level(level_id)
+                node = child
             
             # Store clients at leaf node
             if 'clients' not in node:
@@ -138,18 +220,26 @@ class ThreadSafeTopicTrie:
     def remove(self, topic: str, client_info: Any):
         """Remove topic subscription"""
         with self._lock:
-            parts = topic.split('/')
             node = self._trie
+            path = []
             
-            for part in parts:
-                if part not in node:
+            for level_id in self._lookup_tokens(topic):
+                path.append((node, level_id))
+                node = node.get(level_id)
+                if node is None:
                     return  # Topic not found
-                node = node[part]
             
             if 'clients' in node:
                 node['clients'].discard(client_info)
                 if len(node['clients']) == 0:
                     del node['clients']
+            
+            # Prune nodes left without clients or children
+            while path and not node:
+                parent, level_id = path.pop()
+                del parent[level_id]
+                self._release_level(level_id)
+                node = parent
     
     def find_matching(self, publish_topic: str) -> Set:
         """
@@ -161,39 +251,54 @@ class ThreadSafeTopicTrie:
         Returns:
             Set of client_info objects that match
         """
+        matches = set()
+        
         with self._lock:
-            matches = set()
-            parts = publish_topic.split('/')
-            self._find_recursive(self._trie, parts, 0, matches)
+            parts = self._lookup_tokens(publish_topic)
+            depth = len(parts)
+            plus_id = self._PLUS_ID
+            hash_id = self._HASH_ID
+            # Iterative walk over (node, level index) pairs instead of recursion
+            frontier = [(self._trie, 0)]
+            pop = frontier.pop
+            push = frontier.append
+            while frontier:
+                node, index = pop()
+                
+                if index == depth:
+                    # Reached end of topic path
+                    clients = node.get('clients')
+                    if clients is not None:
+                        matches.update(clients._data)
+                    continue
+                
+                # Exact match
+                child = node.get(parts[index])
+                if child is not None:
+                    push((child, index + 1))
+                
+                # Single-level wildcard (+)
+                child = node.get(plus_id)
+                if child is not None:
+                    push((child, index + 1))
+                
+                # Multi-level wildcard (#) - matches everything from here
+                child = node.get(hash_id)
+                if child is not None:
+                    clients = child.get('clients')
+                    if clients is not None:
+                        matches.update(clients._data)
             return matches
     
-    def _find_recursive(self, node: Dict, parts: List[str], index: int, matches: Set):
-        """Recursive matching with wildcard support"""
-        if index >= len(parts):
-            # Reached end of topic path
-            if 'clients' in node:
-                matches.update(node['clients']._data)
-            return
-        
-        part = parts[index]
-        
-        # Exact match
-        if part in node:
-            self._find_recursive(node[part], parts, index + 1, matches)
-        
-        # Single-level wildcard (+)
-        if '+' in node:
-            self._find_recursive(node['+'], parts, index + 1, matches)
-        
-        # Multi-level wildcard (#) - matches everything from here
-        if '#' in node:
-            if 'clients' in node['#']:
-                matches.update(node['#']['clients']._data)
-    
     def clear(self):
         """Clear all subscriptions"""
         with self._lock:
             self._trie.clear()
+            self._intern = {'+': self._PLUS_ID, '#': self._HASH_ID}
+            self._level_refs.clear()
+            self._unreferenced = 0
+            self._next_id = self._FIRST_LEVEL_ID
+            self._lookup_cache.clear()
 
 
 class ThreadSafeConnectionPool:
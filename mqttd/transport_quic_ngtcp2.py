@@ -14,6 +14,7 @@ import asyncio
 import logging
 import socket
 import ctypes
+import functools
 import time
 import os
 import secrets
@@ -22,7 +23,7 @@ from ctypes import (
     c_size_t, c_ssize_t, Structure, Array, create_string_buffer
 )
 from typing import Optional, Dict, Callable, Any, Tuple, List
-from collections import defaultdict
+from collections import defaultdict, deque
 import struct
 
 # Import ngtcp2 bindings
@@ -32,7 +33,7 @@ try:
         ngtcp2_cid, ngtcp2_conn, ngtcp2_settings, ngtcp2_transport_params,
         ngtcp2_path, ngtcp2_path_storage, ngtcp2_addr, ngtcp2_conn_callbacks,
         ngtcp2_crypto_conn_ref, SendPacketFunc, RecvPacketFunc,
-        ngtcp2_settings_default, ngtcp2_transport_params_default,
+        make_settings, make_transport_params,
         ngtcp2_conn_server_new, ngtcp2_accept, ngtcp2_conn_read_pkt,
         ngtcp2_conn_write_pkt, ngtcp2_conn_handle_expiry, ngtcp2_conn_close,
         ngtcp2_conn_get_expiry, ngtcp2_conn_get_handshake_completed, ngtcp2_conn_del,
@@ -49,7 +50,7 @@ except ImportError:
         ngtcp2_cid, ngtcp2_conn, ngtcp2_settings, ngtcp2_transport_params,
         ngtcp2_path, ngtcp2_path_storage, ngtcp2_addr, ngtcp2_conn_callbacks,
         ngtcp2_crypto_conn_ref, SendPacketFunc, RecvPacketFunc,
-        ngtcp2_settings_default, ngtcp2_transport_params_default,
+        make_settings, make_transport_params,
         ngtcp2_conn_server_new, ngtcp2_accept, ngtcp2_conn_read_pkt,
         ngtcp2_conn_write_pkt, ngtcp2_conn_handle_expiry, ngtcp2_conn_close,
         ngtcp2_conn_get_expiry, ngtcp2_conn_get_handshake_completed, ngtcp2_conn_del,
@@ -79,8 +80,58 @@ logger = logging.getLogger(__name__)
 MAX_PKT_BURST = 10
 MAX_UDP_PAYLOAD_SIZE = 1452
 QUIC_MAX_STREAMS = 256 * 1024
+STREAM_VEC_GROW_WINDOW = 64  # Stream index slots the lookup vector may grow by at once
 HANDSHAKE_TIMEOUT = 10 * NGTCP2_SECONDS  # 10 seconds
 
+# UDP generic segmentation offload (Linux >= 4.18): one sendmsg() carrying a
+# buffer of equal-sized datagrams, split by the kernel (see curl's vquic.c)
+SOL_UDP = getattr(socket, 'SOL_UDP', 17)
+UDP_SEGMENT = getattr(socket, 'UDP_SEGMENT', 103)
+
+# Free-list of packet buffers shared by all connections, so an idle
+# connection holds no buffer and busy ones don't allocate per packet.
+# deque append/pop are atomic, so no extra lock is needed.
+_PktBuf = c_uint8 * MAX_UDP_PAYLOAD_SIZE
+_BUF_POOL: deque = deque(maxlen=256)
+
+
+def _get_buf() -> Array:
+    """Take a packet buffer from the pool, allocating one if it is empty"""
+    try:
+        return _BUF_POOL.pop()
+    except IndexError:
+        return _PktBuf()
+
+
+def _put_buf(buf: Array):
+    """Return a packet buffer to the pool"""
+    _BUF_POOL.append(buf)
+
+
+@functools.lru_cache(maxsize=1)
+def _server_templates() -> Tuple[ngtcp2_settings, ngtcp2_transport_params]:
+    """
+    Settings and transport params shared by every server connection.
+    
+    Built on first use (after TLS initialization) and copied into each new
+    connection, so ngtcp2's *_default functions run once per process.
+    """
+    settings = make_settings()
+    settings.handshake_timeout = HANDSHAKE_TIMEOUT
+    settings.max_window = 100 * 1024 * 1024  # 100 MB
+    settings.max_stream_window = 10 * 1024 * 1024  # 10 MB
+    
+    params = make_transport_params()
+    params.initial_max_data = settings.max_window
+    params.initial_max_stream_data_bidi_local = 32 * 1024
+    params.initial_max_stream_data_bidi_remote = 32 * 1024
+    params.initial_max_stream_data_uni = settings.max_window
+    params.initial_max_streams_bidi = QUIC_MAX_STREAMS
+    params.initial_max_streams_uni = QUIC_MAX_STREAMS
+    params.max_idle_timeout = 0  # No idle timeout
+    
+    return settings, params
+
 
 class NGTCP2Stream:
     """
@@ -102,6 +153,9 @@ class NGTCP2Stream:
         self.recv_buffer = bytearray()
         self.send_buffer = bytearray()
         
+        # Set whenever data arrives or the stream closes, to wake waiting readers
+        self._data_event = asyncio.Event()
+        
         # User data (for MQTT handler)
         self.user_data: Optional[Any] = None
     
@@ -111,6 +165,7 @@ class NGTCP2Stream:
         self.rx_offset += len(data)
         if fin:
             self.state = "closed"
+        self._data_event.set()
     
     def get_data(self) -> bytes:
         """Get and clear received data"""
@@ -125,6 +180,7 @@ class NGTCP2Stream:
     def close(self):
         """Close the stream"""
         self.state = "closed"
+        self._data_event.set()
         # Check if connection has conn attribute (may be Mock in tests)
         if hasattr(self.connection, 'conn') and self.connection.conn:
             # Shutdown stream in ngtcp2
@@ -154,28 +210,38 @@ class NGTCP2StreamReader:
     
     async def read(self, n: int = -1) -> bytes:
         """Read data from stream"""
-        # Wait for data if buffer is empty
-        while len(self.stream.recv_buffer) == 0 and self.stream.state != "closed":
-            await asyncio.sleep(0.01)
+        # Wait for data if buffer is empty (returns at once if data is buffered)
+        stream = self.stream
+        while len(stream.recv_buffer) == 0 and stream.state != "closed":
+            stream._data_event.clear()
+            await stream._data_event.wait()
         
-        if n == -1:
-            data = bytes(self.stream.recv_buffer)
-            self.stream.recv_buffer.clear()
+        buf = self.stream.recv_buffer
+        if n == -1 or n >= len(buf):
+            data = bytes(buf)
+            buf.clear()
             return data
         
-        data = bytes(self.stream.recv_buffer[:n])
-        self.stream.recv_buffer = self.stream.recv_buffer[n:]
+        # Copy once through a memoryview, then drop the consumed prefix in place
+        # (deleting from the front of a bytearray is amortized O(1) in CPython)
+        with memoryview(buf)[:n] as view:
+            data = bytes(view)
+        del buf[:n]
         return data
     
     async def readexactly(self, n: int) -> bytes:
         """Read exactly n bytes"""
-        data = b''
+        # Fast path: everything is already buffered
+        if len(self.stream.recv_buffer) >= n:
+            return await self.read(n)
+        
+        data = bytearray()
         while len(data) < n and self.stream.state != "closed":
             chunk = await self.read(n - len(data))
             if not chunk:
                 raise EOFError("Stream closed")
             data += chunk
-        return data
+        return bytes(data)
 
 
 class NGTCP2StreamWriter:
@@ -215,8 +281,10 @@ class NGTCP2StreamWriter:
     
     async def wait_closed(self):
         """Wait for stream to close"""
-        while self.stream.state != "closed":
-            await asyncio.sleep(0.01)
+        stream = self.stream
+        while stream.state != "closed":
+            stream._data_event.clear()
+            await stream._data_event.wait()
     
     def get_extra_info(self, name: str):
         """Get extra connection info"""
@@ -259,6 +327,10 @@ class NGTCP2Connection:
         self.streams: Dict[int, NGTCP2Stream] = {}
         self.next_stream_id = 0  # For server-initiated streams
         
+        # Fast lookup for get_stream: one list per stream type (the low 2 bits
+        # of the ID), indexed by stream_id >> 2 since IDs are allocated densely
+        self._stream_vec: List[List[Optional[NGTCP2Stream]]] = [[], [], [], []]
+        
         # Timestamps
         self.created_at = time.time()
         self.last_packet_at = time.time()
@@ -267,6 +339,9 @@ class NGTCP2Connection:
         # Path storage
         self.path_storage = ngtcp2_path_storage()
         
+        # ctypes argument for the path, built once instead of on every FFI call
+        self._path_ref = byref(self.path_storage.ps) if self.path else None
+        
         # Settings and transport params
         self.settings = ngtcp2_settings()
         self.transport_params = ngtcp2_transport_params()
@@ -298,47 +373,12 @@ class NGTCP2Connection:
                     return False
                 self.server.tls_initialized = True
             
-            # Initialize settings with defaults
-            # WORKAROUND: ngtcp2_settings_default crashes in some configurations
-            # Manually initialize settings instead to avoid crash
-            # This is safe because we're setting the same defaults that ngtcp2 would set
-            try:
-                if ngtcp2_settings_default:
-                    ngtcp2_settings_default(byref(self.settings))
-            except (SystemError, OSError, RuntimeError, AttributeError) as e:
-                # If settings_default crashes or is None, manually initialize
-                logger.debug(f"ngtcp2_settings_default not available, using manual initialization: {e}")
-                # Manually set defaults (minimal required fields)
-                # Zero out the structure first
-                import ctypes
-                ctypes.memset(ctypes.byref(self.settings), 0, ctypes.sizeof(self.settings))
-                # Set basic required fields (matching ngtcp2 defaults)
-                self.settings.cc_algo = 0  # NGTCP2_CC_ALGO_CUBIC
-                self.settings.initial_rtt = 333000  # 333ms (NGTCP2_DEFAULT_INITIAL_RTT)
-                self.settings.ack_thresh = 2
-                self.settings.max_tx_udp_payload_size = 1452  # 1500 - 48 (UDP header)
-                self.settings.handshake_timeout = HANDSHAKE_TIMEOUT
-                self.settings.max_window = 100 * 1024 * 1024  # 100 MB
-                self.settings.max_stream_window = 10 * 1024 * 1024  # 10 MB
-            
-            # Set custom settings
+            # Start from the server-wide templates; only per-connection fields differ
+            settings_template, params_template = _server_templates()
+            ctypes.memmove(byref(self.settings), byref(settings_template), ctypes.sizeof(ngtcp2_settings))
+            ctypes.memmove(byref(self.transport_params), byref(params_template),
+                           ctypes.sizeof(ngtcp2_transport_params))
             self.settings.initial_ts = int(time.time() * NGTCP2_SECONDS)
-            self.settings.handshake_timeout = HANDSHAKE_TIMEOUT
-            self.settings.max_window = 100 * 1024 * 1024  # 100 MB
-            self.settings.max_stream_window = 10 * 1024 * 1024  # 10 MB
-            
-            # Initialize transport params with defaults
-            if ngtcp2_transport_params_default:
-                ngtcp2_transport_params_default(byref(self.transport_params))
-            
-            # Set transport params
-            self.transport_params.initial_max_data = self.settings.max_window
-            self.transport_params.initial_max_stream_data_bidi_local = 32 * 1024
-            self.transport_params.initial_max_stream_data_bidi_remote = 32 * 1024
-            self.transport_params.initial_max_stream_data_uni = self.settings.max_window
-            self.transport_params.initial_max_streams_bidi = QUIC_MAX_STREAMS
-            self.transport_params.initial_max_streams_uni = QUIC_MAX_STREAMS
-            self.transport_params.max_idle_timeout = 0  # No idle timeout
             
             # Set original_dcid for server (from client's first Initial packet)
             dcid_cid = ngtcp2_cid(self.dcid)
@@ -361,7 +401,7 @@ class NGTCP2Connection:
                 byref(conn_ptr),  # conn (out)
                 byref(dcid_cid),  # dcid
                 byref(scid_cid),  # scid
-                byref(self.path_storage.ps) if self.path else None,  # path
+                self._path_ref,  # path
                 NGTCP2_PROTO_VER_V1,  # client_chosen_version
                 byref(self.callbacks),  # callbacks
                 byref(self.settings),  # settings
@@ -413,7 +453,7 @@ class NGTCP2Connection:
             # Read packet into connection
             result = ngtcp2_conn_read_pkt(
                 self.conn,
-                byref(self.path_storage.ps) if self.path else None,
+                self._path_ref,
                 None,  # pkt_info (can be NULL)
                 pkt_data,
                 len(data),
@@ -466,38 +506,49 @@ class NGTCP2Connection:
             # We need to call ngtcp2_conn_write_pkt in a loop until no more packets
             max_packets = MAX_PKT_BURST
             packets_sent = 0
+            burst: List[bytes] = []
             
-            while packets_sent < max_packets:
-                # Allocate buffer for packet
-                pkt_buf = (c_uint8 * MAX_UDP_PAYLOAD_SIZE)()
-                pktlen = c_size_t(0)
-                
-                # Write packet
-                result = ngtcp2_conn_write_pkt(
-                    self.conn,
-                    byref(self.path_storage.ps) if self.path else None,
-                    pkt_buf,
-                    MAX_UDP_PAYLOAD_SIZE,
-                    byref(pktlen),
-                    timestamp,
-                    self.user_data_ptr,
-                    None,  # send_pkt callback (handled via Python)
-                )
-                
-                if result != 0:
-                    # No more packets to send or error
-                    break
-                
-                if pktlen.value > 0:
-                    # Send packet via UDP
-                    pkt_data = bytes(pkt_buf[:pktlen.value])
-                    self.server.send_packet(pkt_data, self.remote_addr)
-                    packets_sent += 1
-                    self.packets_sent += 1
-                    self.bytes_sent += pktlen.value
-                    self.last_io_at = time.time()
-                else:
-                    break
+            # One pooled buffer serves the whole burst; each packet is copied out
+            pkt_buf = _get_buf()
+            pkt_view = memoryview(pkt_buf)
+            pktlen = c_size_t(0)
+            pktlen_ref = byref(pktlen)
+            
+            try:
+                while packets_sent < max_packets:
+                    pktlen.value = 0
+                    
+                    # Write packet
+                    result = ngtcp2_conn_write_pkt(
+                        self.conn,
+                        self._path_ref,
+                        pkt_buf,
+                        MAX_UDP_PAYLOAD_SIZE,
+                        pktlen_ref,
+                        timestamp,
+                        self.user_data_ptr,
+                        None,  # send_pkt callback (handled via Python)
+                    )
+                    
+                    if result != 0:
+                        # No more packets to send or error
+                        break
+                    
+                    if pktlen.value > 0:
+                        # Queue packet; the whole burst is flushed in one batch below
+                        burst.append(pkt_view[:pktlen.value].tobytes())
+                        packets_sent += 1
+                        self.packets_sent += 1
+                        self.bytes_sent += pktlen.value
+                    else:
+                        break
+            finally:
+                pkt_view.release()
+                _put_buf(pkt_buf)
+            
+            if burst:
+                self.server.send_packet_batch(burst, self.remote_addr)
+                self.last_io_at = time.time()
             
             return True
             
@@ -526,7 +577,7 @@ class NGTCP2Connection:
                         # Handle expiry
                         result = ngtcp2_conn_handle_expiry(
                             self.conn,
-                            byref(self.path_storage.ps) if self.path else None,
+                            self._path_ref,
                             timestamp,
                             self.user_data_ptr,
                             None,  # send_pkt callback
@@ -546,9 +597,25 @@ class NGTCP2Connection:
     
     def get_stream(self, stream_id: int) -> Optional[NGTCP2Stream]:
         """Get or create a stream"""
-        if stream_id not in self.streams:
-            self.streams[stream_id] = NGTCP2Stream(stream_id, self)
-        return self.streams[stream_id]
+        vec = self._stream_vec[stream_id & 3]
+        idx = stream_id >> 2
+        if idx < len(vec):
+            stream = vec[idx]
+            if stream is not None:
+                return stream
+        
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            stream = NGTCP2Stream(stream_id, self)
+            self.streams[stream_id] = stream
+        
+        # Sparse IDs (far past the vector's end) stay in the dict only, so a
+        # peer picking a high stream ID cannot make us allocate a huge list
+        if idx < len(vec) + STREAM_VEC_GROW_WINDOW and idx < QUIC_MAX_STREAMS:
+            if idx >= len(vec):
+                vec.extend([None] * (idx + 1 - len(vec)))
+            vec[idx] = stream
+        return stream
     
     def _extract_stream_data(self):
         """
@@ -597,7 +664,7 @@ class NGTCP2Connection:
                 # ngtcp2_conn_close is a wrapper that handles packet sending
                 result = ngtcp2_conn_close(
                     self.conn,
-                    byref(self.path_storage.ps) if self.path else None,
+                    self._path_ref,
                     error_code,
                     None,  # reason (not used in wrapper)
                     0,  # reasonlen
@@ -624,6 +691,8 @@ class NGTCP2Connection:
         for stream in list(self.streams.values()):
             stream.close()
         self.streams.clear()
+        for vec in self._stream_vec:
+            vec.clear()
         
         # Delete ngtcp2 connection
         if self.conn and ngtcp2_conn_del:
@@ -674,6 +743,9 @@ class QUICServerNGTCP2:
         self.packets_received = 0
         self.packets_sent = 0
         
+        # Use UDP GSO for packet bursts until the kernel rejects it
+        self._gso_enabled = hasattr(socket.socket, 'sendmsg') and os.name == 'posix'
+        
         # TLS initialization flag - will be set when first connection initializes
         self.tls_initialized = False
         
@@ -832,7 +904,8 @@ class QUICServerNGTCP2:
         except Exception as e:
             logger.error(f"Error handling packet: {e}", exc_info=True)
     
-    def _extract_dcid(self, data: bytes) -> Optional[bytes]:
+    @staticmethod
+    def _extract_dcid(data: bytes) -> Optional[bytes]:
         """Extract Destination Connection ID from packet (simplified)"""
         # This is a simplified version. Full implementation would use
         # ngtcp2_pkt_decode_version_cid or parse QUIC header properly.
@@ -854,7 +927,8 @@ class QUICServerNGTCP2:
         
         return None
     
-    def _is_initial_packet(self, data: bytes) -> bool:
+    @staticmethod
+    def _is_initial_packet(data: bytes) -> bool:
         """Check if packet is an Initial packet"""
         if len(data) < 1:
             return False
@@ -870,6 +944,48 @@ class QUICServerNGTCP2:
             except Exception as e:
                 logger.error(f"Error sending packet: {e}")
     
+    def send_packet_batch(self, packets: List[bytes], addr: Tuple[str, int]):
+        """
+        Send a burst of QUIC packets to one peer
+        
+        When every packet but the last has the same size, the burst goes out in
+        a single sendmsg() with a UDP_SEGMENT control message and the kernel
+        splits it into datagrams. Otherwise (or without GSO support) packets
+        are sent one by one.
+        """
+        if not packets:
+            return
+        
+        segment_size = len(packets[0])
+        if (
+            len(packets) > 1
+            and self._gso_enabled
+            and self.sock
+            and self.transport
+            and not self.transport.is_closing()
+            # Don't overtake datagrams still queued in the transport
+            and self.transport.get_write_buffer_size() == 0
+            and len(packets[-1]) <= segment_size
+            and all(len(pkt) == segment_size for pkt in packets[:-1])
+        ):
+            try:
+                self.sock.sendmsg(
+                    [b"".join(packets)],
+                    [(SOL_UDP, UDP_SEGMENT, struct.pack("=H", segment_size))],
+                    0,
+                    addr,
+                )
+                self.packets_sent += len(packets)
+                return
+            except BlockingIOError:
+                pass  # Socket buffer full - let the transport queue them
+            except OSError as e:
+                logger.debug(f"UDP GSO not available, sending packets individually: {e}")
+                self._gso_enabled = False
+        
+        for pkt in packets:
+            self.send_packet(pkt, addr)
+    
     async def _handle_mqtt_over_quic(self, connection: NGTCP2Connection, stream: NGTCP2Stream):
         """
         Handle MQTT data received over QUIC stream
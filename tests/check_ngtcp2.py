@@ -9,9 +9,6 @@ If it crashes, we know tests will crash too.
 import sys
 import os
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 # Skip TLS initialization
 os.environ['MQTTD_SKIP_TLS_INIT'] = '1'
 
@@ -2,30 +2,123 @@
 Pytest configuration and fixtures for ngtcp2 tests
 """
 
+import asyncio
+import functools
 import pytest
-import sys
+import pytest_asyncio
 import os
+import socket
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+# Skip TLS initialization in tests to avoid crashes when ngtcp2 is not fully configured
+os.environ.setdefault('MQTTD_SKIP_TLS_INIT', '1')
+
+
+@functools.lru_cache(maxsize=None)
+def _ngtcp2_avail():
+    """Import the ngtcp2 transport on first use so collection doesn't load the library"""
+    try:
+        from mqttd.transport_quic_ngtcp2 import NGTCP2_AVAILABLE
+    except ImportError:
+        return False
+    return NGTCP2_AVAILABLE
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip tests marked with @pytest.mark.ngtcp2 at collection time when the library is not available"""
+    marked = [item for item in items if "ngtcp2" in item.keywords]
+    # Only probe ngtcp2 when a selected test actually needs it
+    if not marked or _ngtcp2_avail():
+        return
+    skip = pytest.mark.skip(reason="ngtcp2 not available")
+    for item in marked:
+        item.add_marker(skip)
+
+
+async def _start_mqtt_app(**kwargs):
+    """Start an MQTTApp on an ephemeral port and wait until it is listening"""
+    from mqttd import MQTTApp
+
+    app = MQTTApp(host="127.0.0.1", port=0, **kwargs)
+    server_task = asyncio.create_task(app._start_server())
+
+    # Wait for the readiness event, surfacing startup errors if the task dies first
+    ready_task = asyncio.create_task(app.ready.wait())
+    await asyncio.wait({ready_task, server_task}, return_when=asyncio.FIRST_COMPLETED)
+    if not app.ready.is_set():
+        ready_task.cancel()
+        server_task.result()
+
+    port = app._server.sockets[0].getsockname()[1]
+    return app, server_task, port
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-try:
-    from mqttd.transport_quic_ngtcp2 import NGTCP2_AVAILABLE
-except ImportError:
-    NGTCP2_AVAILABLE = False
+async def _stop_mqtt_app(app, server_task):
+    """Stop an MQTTApp started by _start_mqtt_app"""
+    app._running = False
+    if app._server:
+        app._server.close()
+        await app._server.wait_closed()
+    server_task.cancel()
+    try:
+        await server_task
+    except asyncio.CancelledError:
+        pass
+
+
+def _wait_for_port(port, proc, timeout=2.0):
+    """Wait until something accepts TCP connections on 127.0.0.1:port"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Broker exited early with code {proc.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                return
+        except OSError:
+            time.sleep(0.01)
+    raise TimeoutError(f"Broker did not start listening on port {port}")
 
 
 @pytest.fixture(scope="session")
-def ngtcp2_available():
-    """Fixture to check if ngtcp2 is available"""
-    return NGTCP2_AVAILABLE
+def broker_proc(unused_tcp_port_factory):
+    """Fixture yielding the port of a broker subprocess shared by the whole session"""
+    port = unused_tcp_port_factory()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "mqttd", "--host", "127.0.0.1", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for_port(port, proc)
+        yield port
+    finally:
+        proc.terminate()
+        proc.wait()
 
 
-@pytest.fixture
-def skip_if_no_ngtcp2(ngtcp2_available):
-    """Fixture to skip tests if ngtcp2 is not available"""
-    if not ngtcp2_available:
-        pytest.skip("ngtcp2 not available")
+@pytest_asyncio.fixture
+async def limited_mqtt_server(request):
+    """Fixture yielding a started MQTTApp with max_connections set from request.param"""
+    app, server_task, port = await _start_mqtt_app(max_connections=request.param)
+    yield app, port
+    await _stop_mqtt_app(app, server_task)
+
+
+@pytest.fixture(scope="session")
+def sample_messages():
+    """Fixture with MQTT packets built once per session"""
+    from mqttd import MQTTProtocol
+
+    return SimpleNamespace(
+        connect=MQTTProtocol.build_connect("test_client", "user", "pass"),
+        connack=MQTTProtocol.build_connack(0),
+        subscribe=MQTTProtocol.build_subscribe(1, "test/topic", 0),
+        publish=MQTTProtocol.build_publish("test/topic", b"payload", None, 0),
+    )
 
 
 @pytest.fixture
@@ -33,7 +126,7 @@ def mock_quic_server():
     """Fixture to create a mock QUIC server"""
     from unittest.mock import Mock
     from mqttd.transport_quic_ngtcp2 import QUICServerNGTCP2
-    
+
     server = Mock(spec=QUICServerNGTCP2)
     server.host = "127.0.0.1"
     server.port = 1884
@@ -46,7 +139,7 @@ def mock_quic_server():
 def mock_connection(mock_quic_server):
     """Fixture to create a mock QUIC connection"""
     from mqttd.transport_quic_ngtcp2 import NGTCP2Connection
-    
+
     connection = NGTCP2Connection(
         mock_quic_server,
         b"test_dcid_12345678",
@@ -60,6 +153,6 @@ def mock_connection(mock_quic_server):
 def mock_stream(mock_connection):
     """Fixture to create a mock QUIC stream"""
     from mqttd.transport_quic_ngtcp2 import NGTCP2Stream
-    
+
     stream = NGTCP2Stream(stream_id=0, connection=mock_connection)
     return stream
@@ -8,37 +8,118 @@ If ngtcp2 crashes, all tests are skipped gracefully.
 
 import sys
 import os
+import json
+import ctypes.util
 import subprocess
 
 # Skip TLS initialization
 os.environ['MQTTD_SKIP_TLS_INIT'] = '1'
 
-# Add parent directory to path BEFORE any other imports
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROBE_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'mqttd', 'ngtcp2_probe.json')
+
+
+def _find_ngtcp2_library():
+    """Return (path, mtime) of the ngtcp2 shared library, or (None, None)"""
+    lib_name = ctypes.util.find_library('ngtcp2')
+    if not lib_name:
+        return None, None
+    search_paths = ['/usr/local/lib', '/usr/lib', '/lib']
+    search_paths.extend(p for p in os.environ.get('LD_LIBRARY_PATH', '').split(':') if p)
+    for path in search_paths:
+        full_path = os.path.join(path, lib_name)
+        if os.path.exists(full_path):
+            return full_path, os.stat(full_path).st_mtime
+    # Resolved by the dynamic loader only (e.g. ldconfig cache)
+    return lib_name, None
+
+
+def _probe_cache_key():
+    """Build the cache key: library identity, bindings source and Python version"""
+    lib_path, lib_mtime = _find_ngtcp2_library()
+    bindings = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mqttd', 'ngtcp2_bindings.py'
+    )
+    bindings_mtime = os.stat(bindings).st_mtime if os.path.exists(bindings) else None
+    return {
+        'lib_path': lib_path,
+        'lib_mtime': lib_mtime,
+        'bindings_mtime': bindings_mtime,
+        'python': [sys.executable] + list(sys.version_info[:3]),
+    }
+
+
+def _load_cached_probe(key):
+    """Return the cached (safe, stdout, stderr) probe result if the key still matches"""
+    try:
+        with open(PROBE_CACHE_FILE) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('key') != key:
+        return None
+    return cached['result'], cached.get('stdout', ''), cached.get('stderr', '')
+
+
+def _store_probe(key, safe, stdout, stderr):
+    """Persist a probe result; failures to write the cache are not fatal"""
+    try:
+        os.makedirs(os.path.dirname(PROBE_CACHE_FILE), exist_ok=True)
+        with open(PROBE_CACHE_FILE, 'w') as f:
+            json.dump({'key': key, 'result': safe, 'stdout': stdout, 'stderr': stderr}, f)
+    except OSError:
+        pass
+
 
 def check_ngtcp2_safe():
-    """Check if ngtcp2 is safe to use by running check in subprocess"""
+    """Check if ngtcp2 is safe to use, reusing a cached probe when nothing changed"""
+    key = _probe_cache_key()
+    cached = _load_cached_probe(key)
+    if cached is not None:
+        return cached
+    safe, stdout, stderr, conclusive = _run_ngtcp2_probe()
+    # Timeouts and launch errors may be transient; only cache a definite answer
+    if conclusive:
+        _store_probe(key, safe, stdout, stderr)
+    return safe, stdout, stderr
+
+
+def _run_ngtcp2_probe():
+    """
+    Check if ngtcp2 is safe to use by running check in subprocess
+    
+    Returns (safe, stdout, stderr, conclusive); conclusive is True only when the
+    probe exited cleanly or was killed by a crash signal.
+    """
     check_script = os.path.join(os.path.dirname(__file__), 'check_ngtcp2.py')
+    # Minimal environment: only what the probe and the dynamic loader need
+    env = {'MQTTD_SKIP_TLS_INIT': '1', 'PATH': os.environ.get('PATH', '')}
+    if 'LD_LIBRARY_PATH' in os.environ:
+        env['LD_LIBRARY_PATH'] = os.environ['LD_LIBRARY_PATH']
     try:
+        # -I isolates the probe from PYTHON* variables and user site-packages;
+        # -S is not used because the editable mqttd install is a site .pth entry
         result = subprocess.run(
-            [sys.executable, check_script],
+            [sys.executable, '-I', check_script],
             capture_output=True,
-            timeout=5,
-            env=os.environ.copy()
+            text=True,
+            errors='ignore',
+            timeout=2,
+            env=env
         )
+        # Success path: the probe output is only needed to explain failures
+        if result.returncode == 0:
+            return True, "", "", True
         # If returncode is negative, it was killed by signal (crash)
         if result.returncode < 0:
-            return False, "", f"Process crashed (signal {-result.returncode})"
+            return False, "", f"Process crashed (signal {-result.returncode})", True
         # If returncode is 134 or 139, it's a segfault
         if result.returncode in [134, 139]:
-            return False, "", "Process crashed with segfault (ngtcp2 initialization issue)"
-        stdout = result.stdout.decode('utf-8', errors='ignore')
-        stderr = result.stderr.decode('utf-8', errors='ignore')
-        return result.returncode == 0, stdout, stderr
+            return False, "", "Process crashed with segfault (ngtcp2 initialization issue)", True
+        return False, result.stdout, result.stderr, False
     except subprocess.TimeoutExpired:
-        return False, "", "Check timed out (likely crashed)"
+        return False, "", "Check timed out (likely crashed)", False
     except Exception as e:
-        return False, "", f"Check failed: {e}"
+        return False, "", f"Check failed: {e}", False
 
 # Run check immediately - before any imports that might crash
 print("Checking ngtcp2 configuration...")
@@ -58,36 +139,16 @@ if not safe:
 
 print("✓ ngtcp2 appears to be properly configured\n")
 
-# Only import unittest after we know it's safe
-import unittest
+# Only import pytest after we know it's safe
+import pytest
 
-def run_safe_tests(verbosity=1):
-    """Run only safe tests that don't require ngtcp2 initialization"""
-    loader = unittest.TestLoader()
-    start_dir = os.path.dirname(os.path.abspath(__file__))
-    
+def run_safe_tests(verbose=False):
+    """Run only safe tests that don't require ngtcp2 server initialization"""
     # Only run binding tests - these are the safest
-    safe_patterns = [
-        'test_ngtcp2_bindings',
+    safe_tests = [
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_ngtcp2_bindings.py'),
     ]
-    
-    suite = unittest.TestSuite()
-    for pattern in safe_patterns:
-        try:
-            tests = loader.loadTestsFromName(f'tests.{pattern}')
-            suite.addTests(tests)
-        except Exception as e:
-            print(f"Warning: Could not load {pattern}: {e}")
-    
-    if suite.countTestCases() == 0:
-        print("No tests to run")
-        return True
-    
-    # Run tests
-    runner = unittest.TextTestRunner(verbosity=verbosity)
-    result = runner.run(suite)
-    
-    return result.wasSuccessful()
+    return pytest.main(['-v' if verbose else '-q'] + safe_tests)
 
 if __name__ == '__main__':
     import argparse
@@ -96,7 +157,4 @@ if __name__ == '__main__':
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
     
     args = parser.parse_args()
-    verbosity = 2 if args.verbose else 1
-    
-    success = run_safe_tests(verbosity)
-    sys.exit(0 if success else 1)
+    sys.exit(run_safe_tests(args.verbose))
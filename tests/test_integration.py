@@ -3,265 +3,167 @@
 Integration tests to verify server functionality
 """
 
-import sys
-import os
 import asyncio
 import socket
-import time
 
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import pytest
 
-from mqttd import MQTTApp, MQTTProtocol, MQTTMessageType
+from mqttd import MQTTProtocol, MQTTMessageType
 
-async def test_basic_connection():
+
+async def open_client(port):
+    """Open a stream to the test server over a pre-connected, low-latency socket"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, ('127.0.0.1', port))
+    return await asyncio.open_connection(sock=sock)
+
+
+async def read_mqtt_packet(reader):
+    """Read one complete MQTT packet by decoding its remaining length"""
+    header = await reader.readexactly(1)
+    rl_bytes = bytearray()
+    while True:
+        b = await reader.readexactly(1)
+        rl_bytes.append(b[0])
+        if not (b[0] & 0x80):
+            break
+    length, _ = MQTTProtocol.decode_remaining_length(bytes(rl_bytes), 0)
+    body = await reader.readexactly(length)
+    return header + bytes(rl_bytes) + body
+
+
+async def test_basic_connection(broker_proc):
     """Test basic server connection and message flow"""
-    print("Testing basic connection and message flow...")
-    
-    app = MQTTApp(port=18830)  # Use different port to avoid conflicts
-    
-    # Start server in background
-    server_task = asyncio.create_task(app._start_server())
-    
-    # Wait a bit for server to start
-    await asyncio.sleep(0.1)
-    
-    try:
-        # Connect to server
-        reader, writer = await asyncio.open_connection('127.0.0.1', 18830)
-        
-        # Send CONNECT
-        connect_msg = MQTTProtocol.build_connect("test_client", keepalive=60)
-        writer.write(connect_msg)
+    port = broker_proc
+
+    # Connect to server
+    reader, writer = await open_client(port)
+
+    # Send CONNECT
+    connect_msg = MQTTProtocol.build_connect("basic_client", keepalive=60)
+    writer.write(connect_msg)
+    await writer.drain()
+
+    # Read CONNACK
+    connack = await reader.readexactly(4)
+    assert connack[0] == MQTTMessageType.CONNACK
+
+    # Send PINGREQ + SUBSCRIBE as one batch (MQTT is a byte stream)
+    pingreq = MQTTProtocol.build_pingreq()
+    subscribe = MQTTProtocol.build_subscribe(1, "basic/test/topic", 0)
+    writer.write(pingreq + subscribe)
+    await writer.drain()
+
+    # Read PINGRESP
+    pingresp = await reader.readexactly(2)
+    assert pingresp[0] == MQTTMessageType.PINGRESP
+
+    # Read SUBACK
+    suback_data = await read_mqtt_packet(reader)
+    assert suback_data[0] == MQTTMessageType.SUBACK
+
+    # Send PUBLISH
+    publish = MQTTProtocol.build_publish("basic/test/topic", b"test message", None, 0)
+    writer.write(publish)
+    await writer.drain()
+
+    # Should receive PUBLISH (forwarded to subscriber)
+    received = await read_mqtt_packet(reader)
+    assert received[0] & 0xF0 == MQTTMessageType.PUBLISH
+
+    # Send UNSUBSCRIBE + DISCONNECT as one batch
+    unsubscribe = MQTTProtocol.build_unsubscribe(2, ["basic/test/topic"])
+    disconnect = MQTTProtocol.build_disconnect()
+    writer.write(unsubscribe + disconnect)
+    await writer.drain()
+
+    # Read UNSUBACK
+    unsuback_data = await read_mqtt_packet(reader)
+    assert unsuback_data[0] == MQTTMessageType.UNSUBACK
+
+    writer.close()
+    await writer.wait_closed()
+
+
+async def test_retained_messages(broker_proc):
+    """Test retained message functionality"""
+    port = broker_proc
+
+    # Connect client 1 - publish with retain
+    reader1, writer1 = await open_client(port)
+    connect1 = MQTTProtocol.build_connect("retained_client1", keepalive=60)
+    writer1.write(connect1)
+    await writer1.drain()
+    await reader1.readexactly(4)  # CONNACK
+
+    # Publish with retain, then disconnect (one batch)
+    publish_retain = MQTTProtocol.build_publish("retained/sensors/temp", b"25.5", None, 0, retain=True)
+    disconnect1 = MQTTProtocol.build_disconnect()
+    writer1.write(publish_retain + disconnect1)
+    await writer1.drain()
+    writer1.close()
+    await writer1.wait_closed()
+
+    # Connect client 2 - subscribe (should receive retained message)
+    reader2, writer2 = await open_client(port)
+    connect2 = MQTTProtocol.build_connect("retained_client2", keepalive=60)
+    writer2.write(connect2)
+    await writer2.drain()
+    await reader2.readexactly(4)  # CONNACK
+
+    # Subscribe
+    subscribe = MQTTProtocol.build_subscribe(1, "retained/sensors/temp", 0)
+    writer2.write(subscribe)
+    await writer2.drain()
+    await read_mqtt_packet(reader2)  # SUBACK
+
+    # Should receive retained message
+    retained_msg = await read_mqtt_packet(reader2)
+    assert retained_msg[0] & 0xF0 == MQTTMessageType.PUBLISH
+    assert b"25.5" in retained_msg
+
+    writer2.close()
+    await writer2.wait_closed()
+
+
+@pytest.mark.parametrize("limited_mqtt_server", [2], indirect=True)
+async def test_connection_limits(limited_mqtt_server):
+    """Test connection limits"""
+    app, port = limited_mqtt_server
+
+    # Connect 2 clients (should succeed)
+    readers = []
+    writers = []
+    for i in range(2):
+        reader, writer = await open_client(port)
+        connect = MQTTProtocol.build_connect(f"limits_client{i}", keepalive=60)
+        writer.write(connect)
         await writer.drain()
-        
-        # Read CONNACK
         connack = await reader.readexactly(4)
         assert connack[0] == MQTTMessageType.CONNACK
-        print("  ✓ CONNECT/CONNACK successful")
-        
-        # Send PINGREQ
-        pingreq = MQTTProtocol.build_pingreq()
-        writer.write(pingreq)
-        await writer.drain()
-        
-        # Read PINGRESP
-        pingresp = await reader.readexactly(2)
-        assert pingresp[0] == MQTTMessageType.PINGRESP
-        print("  ✓ PINGREQ/PINGRESP successful")
-        
-        # Send SUBSCRIBE
-        subscribe = MQTTProtocol.build_subscribe(1, "test/topic", 0)
-        writer.write(subscribe)
-        await writer.drain()
-        
-        # Read SUBACK
-        suback_data = await reader.read(10)
-        assert suback_data[0] == MQTTMessageType.SUBACK
-        print("  ✓ SUBSCRIBE/SUBACK successful")
-        
-        # Send PUBLISH
-        publish = MQTTProtocol.build_publish("test/topic", b"test message", None, 0)
-        writer.write(publish)
-        await writer.drain()
-        
-        # Should receive PUBLISH (forwarded to subscriber)
-        received = await asyncio.wait_for(reader.read(100), timeout=1.0)
-        assert len(received) > 0
-        assert received[0] & 0xF0 == MQTTMessageType.PUBLISH
-        print("  ✓ PUBLISH forwarding successful")
-        
-        # Send UNSUBSCRIBE
-        unsubscribe = MQTTProtocol.build_unsubscribe(2, ["test/topic"])
-        writer.write(unsubscribe)
-        await writer.drain()
-        
-        # Read UNSUBACK
-        unsuback_data = await reader.read(10)
-        assert unsuback_data[0] == MQTTMessageType.UNSUBACK
-        print("  ✓ UNSUBSCRIBE/UNSUBACK successful")
-        
-        # Send DISCONNECT
+        readers.append(reader)
+        writers.append(writer)
+
+    # Try 3rd connection (should be rejected)
+    try:
+        reader3, writer3 = await open_client(port)
+        connect3 = MQTTProtocol.build_connect("limits_client3", keepalive=60)
+        writer3.write(connect3)
+        await writer3.drain()
+        connack3 = await reader3.readexactly(4)
+        # Should get CONNACK with error (or connection closed)
+        writer3.close()
+        await writer3.wait_closed()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass  # 3rd connection rejected as expected
+
+    # Cleanup
+    for writer in writers:
         disconnect = MQTTProtocol.build_disconnect()
         writer.write(disconnect)
         await writer.drain()
-        
         writer.close()
         await writer.wait_closed()
-        print("  ✓ DISCONNECT successful")
-        
-        print("Basic connection test passed!\n")
-        
-    except Exception as e:
-        print(f"  ❌ Test failed: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        # Stop server
-        app._running = False
-        if app._server:
-            app._server.close()
-            await app._server.wait_closed()
-        server_task.cancel()
-        try:
-            await server_task
-        except asyncio.CancelledError:
-            pass
-
-
-async def test_retained_messages():
-    """Test retained message functionality"""
-    print("Testing retained messages...")
-    
-    app = MQTTApp(port=18831)
-    server_task = asyncio.create_task(app._start_server())
-    await asyncio.sleep(0.1)
-    
-    try:
-        # Connect client 1 - publish with retain
-        reader1, writer1 = await asyncio.open_connection('127.0.0.1', 18831)
-        connect1 = MQTTProtocol.build_connect("client1", keepalive=60)
-        writer1.write(connect1)
-        await writer1.drain()
-        await reader1.readexactly(4)  # CONNACK
-        
-        # Publish with retain
-        publish_retain = MQTTProtocol.build_publish("sensors/temp", b"25.5", None, 0, retain=True)
-        writer1.write(publish_retain)
-        await writer1.drain()
-        
-        # Disconnect
-        disconnect1 = MQTTProtocol.build_disconnect()
-        writer1.write(disconnect1)
-        await writer1.drain()
-        writer1.close()
-        await writer1.wait_closed()
-        
-        # Connect client 2 - subscribe (should receive retained message)
-        reader2, writer2 = await asyncio.open_connection('127.0.0.1', 18831)
-        connect2 = MQTTProtocol.build_connect("client2", keepalive=60)
-        writer2.write(connect2)
-        await writer2.drain()
-        await reader2.readexactly(4)  # CONNACK
-        
-        # Subscribe
-        subscribe = MQTTProtocol.build_subscribe(1, "sensors/temp", 0)
-        writer2.write(subscribe)
-        await writer2.drain()
-        await reader2.read(10)  # SUBACK
-        
-        # Should receive retained message
-        retained_msg = await asyncio.wait_for(reader2.read(100), timeout=1.0)
-        assert len(retained_msg) > 0
-        assert retained_msg[0] & 0xF0 == MQTTMessageType.PUBLISH
-        assert b"25.5" in retained_msg
-        print("  ✓ Retained message delivered on subscription")
-        
-        writer2.close()
-        await writer2.wait_closed()
-        
-        print("Retained messages test passed!\n")
-        
-    except Exception as e:
-        print(f"  ❌ Test failed: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        app._running = False
-        if app._server:
-            app._server.close()
-            await app._server.wait_closed()
-        server_task.cancel()
-        try:
-            await server_task
-        except asyncio.CancelledError:
-            pass
-
-
-async def test_connection_limits():
-    """Test connection limits"""
-    print("Testing connection limits...")
-    
-    app = MQTTApp(port=18832, max_connections=2)
-    server_task = asyncio.create_task(app._start_server())
-    await asyncio.sleep(0.1)
-    
-    try:
-        # Connect 2 clients (should succeed)
-        readers = []
-        writers = []
-        for i in range(2):
-            reader, writer = await asyncio.open_connection('127.0.0.1', 18832)
-            connect = MQTTProtocol.build_connect(f"client{i}", keepalive=60)
-            writer.write(connect)
-            await writer.drain()
-            connack = await reader.readexactly(4)
-            assert connack[0] == MQTTMessageType.CONNACK
-            readers.append(reader)
-            writers.append(writer)
-        
-        print("  ✓ 2 connections accepted (within limit)")
-        
-        # Try 3rd connection (should be rejected)
-        try:
-            reader3, writer3 = await asyncio.open_connection('127.0.0.1', 18832)
-            connect3 = MQTTProtocol.build_connect("client3", keepalive=60)
-            writer3.write(connect3)
-            await writer3.drain()
-            connack3 = await reader3.readexactly(4)
-            # Should get CONNACK with error (or connection closed)
-            writer3.close()
-            await writer3.wait_closed()
-            print("  ✓ 3rd connection handled (may be rejected)")
-        except Exception:
-            print("  ✓ 3rd connection rejected as expected")
-        
-        # Cleanup
-        for writer in writers:
-            disconnect = MQTTProtocol.build_disconnect()
-            writer.write(disconnect)
-            await writer.drain()
-            writer.close()
-            await writer.wait_closed()
-        
-        print("Connection limits test passed!\n")
-        
-    except Exception as e:
-        print(f"  ❌ Test failed: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        app._running = False
-        if app._server:
-            app._server.close()
-            await app._server.wait_closed()
-        server_task.cancel()
-        try:
-            await server_task
-        except asyncio.CancelledError:
-            pass
-
-
-async def main():
-    """Run all integration tests"""
-    print("=" * 60)
-    print("Running Integration Tests")
-    print("=" * 60 + "\n")
-    
-    try:
-        await test_basic_connection()
-        await test_retained_messages()
-        await test_connection_limits()
-        
-        print("=" * 60)
-        print("All integration tests passed! ✓")
-        print("=" * 60)
-        return 0
-    except Exception as e:
-        print(f"\n❌ Integration test error: {e}")
-        import traceback
-        traceback.print_exc()
-        return 1
-
-
-if __name__ == "__main__":
-    sys.exit(asyncio.run(main()))
@@ -8,18 +8,12 @@ Tests full MQTT over QUIC flow including:
 - Connection resilience
 """
 
-import sys
-import os
 import unittest
 import asyncio
 import socket
 from unittest.mock import Mock, patch, AsyncMock
 
-# Skip TLS initialization in tests to avoid crashes
-os.environ['MQTTD_SKIP_TLS_INIT'] = '1'
-
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
 
 try:
     from mqttd.transport_quic_ngtcp2 import (
@@ -38,6 +32,7 @@ except ImportError as e:
     IMPORT_ERROR = str(e)
 
 
+@pytest.mark.ngtcp2
 class TestMQTTOverQUICIntegration(unittest.IsolatedAsyncioTestCase):
     """Integration tests for MQTT over QUIC"""
     
@@ -4,12 +4,9 @@ Comprehensive tests for new Priority 1-4 features
 """
 
 import sys
-import os
 import asyncio
 import struct
-
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import json
 
 from mqttd import MQTTApp, MQTTProtocol, MQTTMessageType, MQTT5Protocol
 from mqttd.properties import PropertyType
@@ -108,7 +105,21 @@ def test_mqtt5_features():
     assert parsed2['topic'] == topic
     assert parsed2['topic_alias'] == topic_alias
     print("  ✓ MQTT 5.0 PUBLISH with topic alias (first time)")
-    
+
+    # Session stores the alias and resolves it on later publishes
+    from mqttd.session import Session, TOPIC_ALIAS_MAXIMUM
+    session = Session(client_id="alias_client")
+    assert session.set_topic_alias(topic_alias, parsed2['topic'])
+    assert session.get_topic_alias(topic_alias) == topic
+    assert session.get_topic_alias(topic_alias - 1) is None
+    assert session.get_topic_alias(topic_alias + 1) is None
+    # Alias 0 and aliases above the advertised maximum are rejected
+    assert not session.set_topic_alias(0, topic)
+    assert not session.set_topic_alias(TOPIC_ALIAS_MAXIMUM + 1, topic)
+    assert not session.set_topic_alias(65535, topic)
+    assert len(session.topic_aliases) == TOPIC_ALIAS_MAXIMUM + 1
+    print("  ✓ MQTT 5.0 topic alias resolution")
+
     # Test MQTT 5.0 SUBSCRIBE parsing (create manually with properties)
     # Build SUBSCRIBE with properties manually for testing
     from mqttd.properties import PropertyEncoder
@@ -123,7 +134,10 @@ def test_mqtt5_features():
     topic_bytes = MQTTProtocol.encode_string("test/topic")
     qos_byte = b'\x01'
     
-    subscribe_data = packet_id_bytes + prop_length_bytes + props_bytes + topic_bytes + qos_byte
+    subscribe_data = MQTT5Protocol._assemble(
+        (packet_id_bytes, prop_length_bytes, props_bytes, topic_bytes, qos_byte)
+    )
+    assert subscribe_data == packet_id_bytes + prop_length_bytes + props_bytes + topic_bytes + qos_byte
     
     parsed_sub = MQTT5Protocol.parse_subscribe_v5(subscribe_data)
     assert parsed_sub['packet_id'] == 456
@@ -133,6 +147,18 @@ def test_mqtt5_features():
     assert parsed_sub['topic'] == "test/topic"
     assert parsed_sub['qos'] == 1
     print("  ✓ MQTT 5.0 SUBSCRIBE with subscription identifier")
+
+    # Shape-specialized encoder matches the generic one byte for byte
+    for props in (
+        {},
+        {PropertyType.SUBSCRIPTION_IDENTIFIER: [1, 2, 300], PropertyType.MESSAGE_EXPIRY_INTERVAL: 60},
+        {PropertyType.TOPIC_ALIAS: 5, PropertyType.CONTENT_TYPE: "text/plain",
+         PropertyType.CORRELATION_DATA: b"\x00\x01", PropertyType.PAYLOAD_FORMAT_INDICATOR: 1},
+    ):
+        expected = PropertyEncoder.encode_properties(props)
+        assert PropertyEncoder.encode_properties_fast(props) == expected
+        assert PropertyEncoder.encode_properties_fast(dict(reversed(props.items()))) == expected
+    print("  ✓ MQTT 5.0 shape-specialized property encoding")
     
     # Test MQTT 5.0 UNSUBSCRIBE/UNSUBACK
     unsubscribe_v5 = MQTT5Protocol.build_unsubscribe_v5(789, ["topic1", "topic2"])
@@ -173,6 +199,11 @@ def test_app_features():
     assert 'total_messages_published' in metrics
     assert 'retained_messages_count' in metrics
     assert 'active_subscriptions_count' in metrics
+    assert 'total_messages_forwarded' in metrics
+    # Callers get their own copy of the per-IP snapshot
+    metrics['connections_per_ip']['10.0.0.1'] = 1
+    assert '10.0.0.1' not in app.get_metrics()['connections_per_ip']
+    json.dumps(app.get_metrics())
     print("  ✓ Metrics tracking")
     
     # Test health check
@@ -229,6 +260,21 @@ def test_trie_functionality():
     matches = trie.find_matching("sensors/temperature")
     assert client1 not in matches
     print("  ✓ Subscription removal")
+
+    # A topic looked up before any subscription uses its levels still matches later
+    assert trie.find_matching("alerts/fire") == set()
+    trie.insert("alerts/fire", client1)
+    assert trie.find_matching("alerts/fire") == {client1}
+    print("  ✓ Lookup after new topic levels are added")
+
+    # Unsubscribe churn does not leak interned levels
+    for i in range(2 * ThreadSafeTopicTrie._PURGE_THRESHOLD):
+        trie.insert(f"churn/{i}", client2)
+        trie.remove(f"churn/{i}", client2)
+    assert len(trie._intern) < ThreadSafeTopicTrie._PURGE_THRESHOLD
+    assert trie.find_matching("alerts/fire") == {client1}
+    assert trie.find_matching("sensors/device1/humidity") == {client2, client3}
+    print("  ✓ Unused topic levels are released")
     
     print("Trie functionality tests passed!\n")
 
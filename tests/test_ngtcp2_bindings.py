@@ -4,13 +4,10 @@ Unit tests for ngtcp2 Python bindings
 Tests library loading, function calls, type conversions, and error handling.
 """
 
-import sys
-import os
 import unittest
 from unittest.mock import patch, MagicMock
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
 
 try:
     from mqttd.ngtcp2_bindings import (
@@ -21,6 +18,8 @@ try:
         ngtcp2_transport_params,
         ngtcp2_settings_default,
         ngtcp2_transport_params_default,
+        make_settings,
+        make_transport_params,
         NGTCP2_MAX_CIDLEN,
         NGTCP2_PROTO_VER_V1,
     )
@@ -39,6 +38,7 @@ class TestNGTCP2Bindings(unittest.TestCase):
         if not BINDINGS_AVAILABLE:
             raise unittest.SkipTest(f"ngtcp2 bindings not available: {IMPORT_ERROR}")
     
+    @pytest.mark.ngtcp2
     def test_library_loading(self):
         """Test that ngtcp2 library can be loaded"""
         self.assertTrue(NGTCP2_AVAILABLE, "NGTCP2_AVAILABLE should be True")
@@ -72,6 +72,7 @@ class TestNGTCP2Bindings(unittest.TestCase):
         params = ngtcp2_transport_params()
         self.assertIsNotNone(params)
     
+    @pytest.mark.ngtcp2
     def test_settings_default_function(self):
         """Test ngtcp2_settings_default function"""
         if ngtcp2_settings_default:
@@ -97,6 +98,7 @@ class TestNGTCP2Bindings(unittest.TestCase):
         else:
             self.skipTest("ngtcp2_settings_default not available")
     
+    @pytest.mark.ngtcp2
     def test_transport_params_default_function(self):
         """Test ngtcp2_transport_params_default function"""
         if ngtcp2_transport_params_default:
@@ -111,6 +113,35 @@ class TestNGTCP2Bindings(unittest.TestCase):
         else:
             self.skipTest("ngtcp2_transport_params_default not available")
     
+    @pytest.mark.ngtcp2
+    def test_make_settings(self):
+        """Test that make_settings returns independent copies of the defaults"""
+        try:
+            from mqttd.ngtcp2_tls_bindings import init_tls_backend
+            init_tls_backend()
+        except Exception:
+            pass
+        
+        first = make_settings()
+        second = make_settings()
+        self.assertIsInstance(first, ngtcp2_settings)
+        self.assertEqual(bytes(first), bytes(second))
+        
+        first.max_window = 12345
+        self.assertNotEqual(second.max_window, 12345)
+        self.assertNotEqual(make_settings().max_window, 12345)
+    
+    @pytest.mark.ngtcp2
+    def test_make_transport_params(self):
+        """Test that make_transport_params returns independent copies of the defaults"""
+        first = make_transport_params()
+        second = make_transport_params()
+        self.assertIsInstance(first, ngtcp2_transport_params)
+        self.assertEqual(bytes(first), bytes(second))
+        
+        first.initial_max_data = 12345
+        self.assertNotEqual(second.initial_max_data, 12345)
+    
     def test_type_conversions(self):
         """Test type conversions"""
         # Test that we can create structures
@@ -5,32 +5,79 @@ Tests connection creation, packet sending/receiving, state transitions,
 stream creation, data read/write, flow control, and stream closure.
 """
 
-import sys
-import os
 import unittest
 import asyncio
+import functools
 import time
 from unittest.mock import Mock, patch, MagicMock
 
-# Skip TLS initialization in tests to avoid crashes
-os.environ['MQTTD_SKIP_TLS_INIT'] = '1'
+import pytest
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Transport classes, bound by _load_quic() when the first test class is set up
+QUICServerNGTCP2 = NGTCP2Connection = NGTCP2Stream = None
+NGTCP2StreamReader = NGTCP2StreamWriter = None
+
+
+@functools.lru_cache(maxsize=None)
+def _load_quic():
+    """Import the ngtcp2 transport on first use; returns the module or the ImportError"""
+    global QUICServerNGTCP2, NGTCP2Connection, NGTCP2Stream, NGTCP2StreamReader, NGTCP2StreamWriter
+    try:
+        import mqttd.transport_quic_ngtcp2 as quic
+    except ImportError as e:
+        return e
+    QUICServerNGTCP2 = quic.QUICServerNGTCP2
+    NGTCP2Connection = quic.NGTCP2Connection
+    NGTCP2Stream = quic.NGTCP2Stream
+    NGTCP2StreamReader = quic.NGTCP2StreamReader
+    NGTCP2StreamWriter = quic.NGTCP2StreamWriter
+    return quic
+
+
+def _require_quic():
+    """Load the transport for a test class, or skip the class if it cannot be imported"""
+    quic = _load_quic()
+    if isinstance(quic, ImportError):
+        raise unittest.SkipTest(f"ngtcp2 QUIC not available: {quic}")
+
+# Packet fixtures, built once at import (hex grouped by header field)
+# Initial packet: first byte 0xC0 (long header 0x80 + Initial 0x00),
+# version 1, DCID length 9, DCID "test_dcid"
+_INITIAL_PACKET_FIXTURE = bytes.fromhex("c0 00000001 09") + b"test_dcid"
+_INITIAL_PACKET_ZEROED = bytes.fromhex("c0") + bytes(20)
+# Short header packet: 0x40
+_SHORT_PACKET = bytes.fromhex("40") + bytes(10)
+
+# Payloads and connection IDs shared by the tests
+_DATA = b"test data"
+_TEST = b"test"
+_DATA_TAIL = b" data"
+_FIRST = b"first"
+_SECOND = b"second"
+_LATE_DATA = b"late data"
+_DCID = b"test_dcid_12345678"
+_SCID = b"test_scid_12345678"
 
 try:
-    from mqttd.transport_quic_ngtcp2 import (
-        NGTCP2_AVAILABLE,
-        QUICServerNGTCP2,
-        NGTCP2Connection,
-        NGTCP2Stream,
-        NGTCP2StreamReader,
-        NGTCP2StreamWriter,
-    )
-    QUIC_AVAILABLE = True
-except ImportError as e:
-    QUIC_AVAILABLE = False
-    IMPORT_ERROR = str(e)
+    import uvloop
+except ImportError:
+    uvloop = None
+
+_saved_loop_policy = None
+
+
+def setUpModule():
+    """Run the IsolatedAsyncioTestCase classes on uvloop when it is installed"""
+    global _saved_loop_policy
+    if uvloop is not None:
+        _saved_loop_policy = asyncio.get_event_loop_policy()
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
+def tearDownModule():
+    """Restore the loop policy so other test modules are unaffected"""
+    if _saved_loop_policy is not None:
+        asyncio.set_event_loop_policy(_saved_loop_policy)
 
 
 class TestNGTCP2Stream(unittest.TestCase):
@@ -39,69 +86,61 @@ class TestNGTCP2Stream(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """Set up test class"""
-        if not QUIC_AVAILABLE:
-            raise unittest.SkipTest(f"ngtcp2 QUIC not available: {IMPORT_ERROR}")
+        _require_quic()
     
     def setUp(self):
         """Set up test fixtures"""
-        # Create a mock connection
-        self.mock_connection = Mock(spec=NGTCP2Connection)
+        # Create a mock connection. No spec: the tests never rely on
+        # AttributeError for unknown attributes, so only conn is pinned
+        self.mock_connection = Mock()
         self.mock_connection.conn = None  # No real ngtcp2 connection
-        
-        # Create a stream
-        self.stream = NGTCP2Stream(stream_id=0, connection=self.mock_connection)
-    
-    def test_stream_creation(self):
-        """Test stream creation"""
-        self.assertEqual(self.stream.stream_id, 0)
-        self.assertEqual(self.stream.state, "open")
-        self.assertEqual(self.stream.rx_offset, 0)
-        self.assertFalse(self.stream.send_closed)
-        self.assertFalse(self.stream.quic_flow_blocked)
-    
-    def test_stream_append_data(self):
-        """Test appending data to stream"""
-        data = b"test data"
-        self.stream.append_data(data)
-        
-        self.assertEqual(len(self.stream.recv_buffer), len(data))
-        self.assertEqual(self.stream.rx_offset, len(data))
-        self.assertEqual(self.stream.state, "open")
-    
-    def test_stream_append_data_with_fin(self):
-        """Test appending data with FIN flag"""
-        data = b"test data"
-        self.stream.append_data(data, fin=True)
-        
-        self.assertEqual(self.stream.state, "closed")
-        self.assertEqual(self.stream.rx_offset, len(data))
-    
-    def test_stream_get_data(self):
-        """Test getting data from stream"""
-        data1 = b"first"
-        data2 = b"second"
-        
-        self.stream.append_data(data1)
-        self.stream.append_data(data2)
-        
-        result = self.stream.get_data()
-        self.assertEqual(result, data1 + data2)
-        self.assertEqual(len(self.stream.recv_buffer), 0)
-    
-    def test_stream_has_data(self):
-        """Test checking if stream has data"""
-        self.assertFalse(self.stream.has_data())
-        
-        self.stream.append_data(b"test")
-        self.assertTrue(self.stream.has_data())
-        
-        self.stream.get_data()
-        self.assertFalse(self.stream.has_data())
     
-    def test_stream_close(self):
-        """Test closing stream"""
-        self.stream.close()
-        self.assertEqual(self.stream.state, "closed")
+    def _fresh_stream(self):
+        """Create a new stream on this test's mock connection"""
+        return NGTCP2Stream(stream_id=0, connection=self.mock_connection)
+    
+    def test_stream_lifecycle(self):
+        """Test stream creation, data buffering and closure (one subTest per stage)"""
+        with self.subTest(stage="create"):
+            stream = self._fresh_stream()
+            self.assertEqual(stream.stream_id, 0)
+            self.assertEqual(stream.state, "open")
+            self.assertEqual(stream.rx_offset, 0)
+            self.assertFalse(stream.send_closed)
+            self.assertFalse(stream.quic_flow_blocked)
+        
+        with self.subTest(stage="append"):
+            stream = self._fresh_stream()
+            stream.append_data(_DATA)
+            self.assertEqual(len(stream.recv_buffer), len(_DATA))
+            self.assertEqual(stream.rx_offset, len(_DATA))
+            self.assertEqual(stream.state, "open")
+        
+        with self.subTest(stage="append_fin"):
+            stream = self._fresh_stream()
+            stream.append_data(_DATA, fin=True)
+            self.assertEqual(stream.state, "closed")
+            self.assertEqual(stream.rx_offset, len(_DATA))
+        
+        with self.subTest(stage="get_data"):
+            stream = self._fresh_stream()
+            stream.append_data(_FIRST)
+            stream.append_data(_SECOND)
+            self.assertEqual(stream.get_data(), _FIRST + _SECOND)
+            self.assertEqual(len(stream.recv_buffer), 0)
+        
+        with self.subTest(stage="has_data"):
+            stream = self._fresh_stream()
+            self.assertFalse(stream.has_data())
+            stream.append_data(_TEST)
+            self.assertTrue(stream.has_data())
+            stream.get_data()
+            self.assertFalse(stream.has_data())
+        
+        with self.subTest(stage="close"):
+            stream = self._fresh_stream()
+            stream.close()
+            self.assertEqual(stream.state, "closed")
 
 
 class TestNGTCP2StreamReader(unittest.IsolatedAsyncioTestCase):
@@ -110,52 +149,58 @@ class TestNGTCP2StreamReader(unittest.IsolatedAsyncioTestCase):
     @classmethod
     def setUpClass(cls):
         """Set up test class"""
-        if not QUIC_AVAILABLE:
-            raise unittest.SkipTest(f"ngtcp2 QUIC not available: {IMPORT_ERROR}")
+        _require_quic()
     
     def setUp(self):
         """Set up test fixtures"""
-        self.mock_connection = Mock(spec=NGTCP2Connection)
+        self.mock_connection = Mock()
+        self.mock_connection.conn = None
         self.stream = NGTCP2Stream(stream_id=0, connection=self.mock_connection)
         self.reader = NGTCP2StreamReader(self.stream)
     
     async def test_read_with_data(self):
         """Test reading data when available"""
-        self.stream.append_data(b"test data")
+        self.stream.append_data(_DATA)
         
         data = await self.reader.read()
-        self.assertEqual(data, b"test data")
+        self.assertEqual(data, _DATA)
         self.assertEqual(len(self.stream.recv_buffer), 0)
     
     async def test_read_with_size(self):
         """Test reading specific amount of data"""
-        self.stream.append_data(b"test data")
+        self.stream.append_data(_DATA)
         
         data = await self.reader.read(4)
-        self.assertEqual(data, b"test")
+        self.assertEqual(data, _TEST)
         self.assertEqual(len(self.stream.recv_buffer), 5)  # " data" remaining
     
+    async def test_read_waits_for_data(self):
+        """Test that read() wakes up as soon as data is appended"""
+        task = asyncio.create_task(self.reader.read())
+        await asyncio.sleep(0)
+        self.assertFalse(task.done())
+        
+        self.stream.append_data(_LATE_DATA)
+        data = await asyncio.wait_for(task, timeout=1.0)
+        self.assertEqual(data, _LATE_DATA)
+    
     async def test_readexactly(self):
         """Test reading exactly n bytes"""
-        self.stream.append_data(b"test data")
+        self.stream.append_data(_DATA)
         
         data = await self.reader.readexactly(4)
-        self.assertEqual(data, b"test")
+        self.assertEqual(data, _TEST)
         
         data = await self.reader.readexactly(5)
-        self.assertEqual(data, b" data")
+        self.assertEqual(data, _DATA_TAIL)
     
     async def test_readexactly_insufficient_data(self):
         """Test readexactly with insufficient data"""
-        self.stream.append_data(b"test")
-        
-        # This should wait and eventually raise EOFError when stream closes
-        # For this test, we'll close the stream after a delay
-        async def close_stream():
-            await asyncio.sleep(0.1)
-            self.stream.close()
+        self.stream.append_data(_TEST)
         
-        asyncio.create_task(close_stream())
+        # This should wait and raise EOFError once the stream closes
+        # Runs on the next loop iteration, after the waiter has started awaiting
+        asyncio.get_running_loop().call_soon(self.stream.close)
         
         with self.assertRaises(EOFError):
             await self.reader.readexactly(10)
@@ -167,28 +212,28 @@ class TestNGTCP2StreamWriter(unittest.IsolatedAsyncioTestCase):
     @classmethod
     def setUpClass(cls):
         """Set up test class"""
-        if not QUIC_AVAILABLE:
-            raise unittest.SkipTest(f"ngtcp2 QUIC not available: {IMPORT_ERROR}")
+        _require_quic()
     
     def setUp(self):
         """Set up test fixtures"""
-        self.mock_connection = Mock(spec=NGTCP2Connection)
+        self.mock_connection = Mock()
         self.mock_connection.conn = None
         self.mock_connection.remote_addr = ("127.0.0.1", 1884)
-        self.mock_connection.send_packets = Mock(return_value=True)
+        # Plain stub: no test inspects these calls
+        self.mock_connection.send_packets = lambda *args, **kwargs: True
         
-        self.mock_server = Mock(spec=QUICServerNGTCP2)
+        self.mock_server = Mock()
         
         self.stream = NGTCP2Stream(stream_id=0, connection=self.mock_connection)
         self.writer = NGTCP2StreamWriter(self.mock_connection, self.stream, self.mock_server)
     
     def test_write(self):
         """Test writing data"""
-        data = b"test data"
+        data = _DATA
         self.writer.write(data)
         
         self.assertEqual(len(self.stream.send_buffer), len(data))
-        self.assertEqual(bytes(self.stream.send_buffer), data)
+        self.assertEqual(self.stream.send_buffer, data)  # bytearray == bytes, no copy
     
     async def test_drain(self):
         """Test draining buffer"""
@@ -204,25 +249,20 @@ class TestNGTCP2StreamWriter(unittest.IsolatedAsyncioTestCase):
     
     async def test_wait_closed(self):
         """Test waiting for stream to close"""
-        async def close_stream():
-            await asyncio.sleep(0.1)
-            self.stream.close()
-        
-        asyncio.create_task(close_stream())
+        # Runs on the next loop iteration, after the waiter has started awaiting
+        asyncio.get_running_loop().call_soon(self.stream.close)
         await self.writer.wait_closed()
         
         self.assertEqual(self.stream.state, "closed")
     
     def test_get_extra_info(self):
         """Test getting extra connection info"""
-        peername = self.writer.get_extra_info('peername')
-        self.assertEqual(peername, ("127.0.0.1", 1884))
-        
-        socket_info = self.writer.get_extra_info('socket')
-        self.assertEqual(socket_info, self.mock_connection)
-        
-        unknown = self.writer.get_extra_info('unknown')
-        self.assertIsNone(unknown)
+        actual = {key: self.writer.get_extra_info(key) for key in ("peername", "socket", "unknown")}
+        self.assertEqual(actual, {
+            "peername": ("127.0.0.1", 1884),
+            "socket": self.mock_connection,
+            "unknown": None,
+        })
 
 
 class TestNGTCP2Connection(unittest.TestCase):
@@ -231,16 +271,15 @@ class TestNGTCP2Connection(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """Set up test class"""
-        if not QUIC_AVAILABLE:
-            raise unittest.SkipTest(f"ngtcp2 QUIC not available: {IMPORT_ERROR}")
+        _require_quic()
     
     def setUp(self):
         """Set up test fixtures"""
-        self.mock_server = Mock(spec=QUICServerNGTCP2)
-        self.mock_server.send_packet = Mock()
+        self.mock_server = Mock()
+        self.mock_server.send_packet = lambda *args, **kwargs: None
         
-        self.dcid = b"test_dcid_12345678"
-        self.scid = b"test_scid_12345678"
+        self.dcid = _DCID
+        self.scid = _SCID
         self.remote_addr = ("127.0.0.1", 1884)
         
         self.connection = NGTCP2Connection(
@@ -271,7 +310,25 @@ class TestNGTCP2Connection(unittest.TestCase):
         # Getting same stream should return same object
         stream2 = self.connection.get_stream(0)
         self.assertEqual(stream, stream2)
-    
+
+    def test_get_stream_types_distinct(self):
+        """Test that stream IDs of different types never share a slot"""
+        streams = [self.connection.get_stream(sid) for sid in range(8)]
+
+        self.assertEqual(len({id(s) for s in streams}), 8)
+        for sid, stream in enumerate(streams):
+            self.assertEqual(stream.stream_id, sid)
+            self.assertIs(self.connection.get_stream(sid), stream)
+
+    def test_get_stream_sparse_id(self):
+        """Test that a high stream ID does not grow the lookup vector"""
+        stream_id = (1000 << 2) | 1
+        stream = self.connection.get_stream(stream_id)
+
+        self.assertIs(self.connection.get_stream(stream_id), stream)
+        self.assertIs(self.connection.streams[stream_id], stream)
+        self.assertEqual(len(self.connection._stream_vec[1]), 0)
+
     def test_connection_cleanup(self):
         """Test connection cleanup"""
         # Create a stream
@@ -284,55 +341,64 @@ class TestNGTCP2Connection(unittest.TestCase):
         self.assertEqual(self.connection.state, "closed")
 
 
+class TestQUICPacketParsing(unittest.TestCase):
+    """Test the stateless QUIC header helpers (no server instance needed)"""
+    
+    @classmethod
+    def setUpClass(cls):
+        """Set up test class"""
+        _require_quic()
+    
+    def test_extract_dcid(self):
+        """Test extracting DCID from packet"""
+        # Mock Initial packet (simplified), see _INITIAL_PACKET_FIXTURE
+        result = QUICServerNGTCP2._extract_dcid(_INITIAL_PACKET_FIXTURE)
+        
+        # Should extract DCID (simplified parsing)
+        # Note: This is a simplified test - real QUIC parsing is more complex
+        if result:
+            self.assertIsInstance(result, bytes)
+    
+    def test_is_initial_packet(self):
+        """Test detecting Initial packets"""
+        self.assertTrue(QUICServerNGTCP2._is_initial_packet(_INITIAL_PACKET_ZEROED))
+        self.assertFalse(QUICServerNGTCP2._is_initial_packet(_SHORT_PACKET))
+        
+        # Empty packet
+        self.assertFalse(QUICServerNGTCP2._is_initial_packet(b""))
+
+
+@pytest.mark.ngtcp2
 class TestQUICServerNGTCP2(unittest.TestCase):
     """Test QUICServerNGTCP2 class"""
     
     @classmethod
     def setUpClass(cls):
         """Set up test class"""
-        if not QUIC_AVAILABLE:
-            raise unittest.SkipTest(f"ngtcp2 QUIC not available: {IMPORT_ERROR}")
-        
-        # Skip this entire test class if ngtcp2 crashes during initialization
+        _require_quic()
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        # Skip if ngtcp2 crashes during initialization
         # The crash "ngtcp2_settings.c:96 ngtcp2_settingslen_version: Unreachable"
         # occurs when ngtcp2 is not properly configured with TLS backend
         # See tests/TESTING_NOTES.md for details
+        patcher = patch('mqttd.transport_quic_ngtcp2.init_tls_backend', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
         try:
-            with patch('mqttd.transport_quic_ngtcp2.init_tls_backend', return_value=False):
-                # Try to create a server instance to see if it crashes
-                test_server = QUICServerNGTCP2(host="127.0.0.1", port=1884)
-                cls._server_creation_works = True
+            # Port 0 (ephemeral) so parallel workers (pytest -n auto) never collide
+            self.server = QUICServerNGTCP2(host="127.0.0.1", port=0)
         except (SystemError, OSError, RuntimeError) as e:
             # ngtcp2 crash or initialization failure
-            raise unittest.SkipTest(f"ngtcp2 crashes during initialization (TLS backend issue): {e}")
-        except Exception as e:
-            # Other errors are OK - we can still test
-            cls._server_creation_works = True
-    
-    def setUp(self):
-        """Set up test fixtures"""
-        if not self._server_creation_works:
-            self.skipTest("Server creation failed in setUpClass")
-        
-        # Use Mock to avoid actual ngtcp2 initialization which can crash
-        # if TLS backend is not properly configured
-        try:
-            with patch('mqttd.transport_quic_ngtcp2.init_tls_backend', return_value=False):
-                self.server = QUICServerNGTCP2(
-                    host="127.0.0.1",
-                    port=1884
-                )
-        except (SystemError, OSError, RuntimeError) as e:
-            # ngtcp2 crash - skip this test
             self.skipTest(f"ngtcp2 crashes during server creation: {e}")
         except Exception as e:
-            # Other errors
             self.skipTest(f"Cannot create server: {e}")
     
     def test_server_creation(self):
         """Test server creation"""
         self.assertEqual(self.server.host, "127.0.0.1")
-        self.assertEqual(self.server.port, 1884)
+        self.assertEqual(self.server.port, 0)
         self.assertEqual(len(self.server.connections), 0)
         self.assertIsNone(self.server.mqtt_handler)
     
@@ -343,33 +409,16 @@ class TestQUICServerNGTCP2(unittest.TestCase):
         
         self.assertEqual(self.server.mqtt_handler, handler)
     
-    def test_extract_dcid(self):
-        """Test extracting DCID from packet"""
-        # Create a mock Initial packet (simplified)
-        # Long header (0x80) + Initial (0x00) = 0xC0
-        # Version (4 bytes) + DCID len (1 byte) + DCID (8 bytes)
-        dcid = b"test_dcid"
-        packet = bytes([0xC0]) + b"\x00\x00\x00\x01" + bytes([len(dcid)]) + dcid
-        
-        result = self.server._extract_dcid(packet)
-        
-        # Should extract DCID (simplified parsing)
-        # Note: This is a simplified test - real QUIC parsing is more complex
-        if result:
-            self.assertIsInstance(result, bytes)
-    
-    def test_is_initial_packet(self):
-        """Test detecting Initial packets"""
-        # Initial packet: Long header (0x80) + Initial (0x00) = 0xC0
-        initial_packet = bytes([0xC0]) + b"\x00" * 20
-        self.assertTrue(self.server._is_initial_packet(initial_packet))
+    def test_send_packet_batch_fallback(self):
+        """Test batched send falls back to per-packet sends without a socket"""
+        packets = [b"a" * 100, b"b" * 100, b"c" * 40]
+        addr = ("127.0.0.1", 54321)
         
-        # Short header packet: 0x40
-        short_packet = bytes([0x40]) + b"\x00" * 10
-        self.assertFalse(self.server._is_initial_packet(short_packet))
+        with patch.object(self.server, 'send_packet') as send_packet:
+            self.server.send_packet_batch(packets, addr)
         
-        # Empty packet
-        self.assertFalse(self.server._is_initial_packet(b""))
+        self.assertEqual(send_packet.call_count, 3)
+        send_packet.assert_called_with(b"c" * 40, addr)
 
 
 if __name__ == '__main__':